@@ -37,6 +37,96 @@ class Config:
     # LLM Configuration
     OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
     DEFAULT_LLM_MODEL = os.environ.get('DEFAULT_LLM_MODEL', 'llama2')
+    OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 10))
+    OLLAMA_POOL_TIMEOUT = float(os.environ.get('OLLAMA_POOL_TIMEOUT', 10))  # seconds a caller waits for a pooled connection
+    OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 3.05))
+    OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 30))
+    OLLAMA_MAX_RETRIES = int(os.environ.get('OLLAMA_MAX_RETRIES', 2))
+    OLLAMA_RETRY_BACKOFF = float(os.environ.get('OLLAMA_RETRY_BACKOFF', 0.5))
+    OLLAMA_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_BREAKER_FAILURE_THRESHOLD', 5))  # consecutive failures that open the circuit
+    OLLAMA_BREAKER_RESET_TIMEOUT = float(os.environ.get('OLLAMA_BREAKER_RESET_TIMEOUT', 30))  # seconds before a probe request
+    OLLAMA_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('OLLAMA_BREAKER_SLOW_CALL_SECONDS', 25))  # slower calls count as failures, 0 disables
+    OLLAMA_BREAKER_LATENCY_WINDOW = int(os.environ.get('OLLAMA_BREAKER_LATENCY_WINDOW', 200))  # recent calls used for latency percentiles
+    LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 3000))
+    LLM_TOKEN_COUNTER = os.environ.get('LLM_TOKEN_COUNTER', 'heuristic')  # 'heuristic', 'tiktoken' or a registered counter
+    LLM_TOKEN_ENCODING = os.environ.get('LLM_TOKEN_ENCODING', 'cl100k_base')
+    
+    # Model Routing Configuration
+    LLM_MODEL_CONCURRENCY = int(os.environ.get('LLM_MODEL_CONCURRENCY', 2))  # concurrent generations per model
+    LLM_MODEL_QUEUE_DEPTH = int(os.environ.get('LLM_MODEL_QUEUE_DEPTH', 8))  # chat requests waiting per model before 503
+    LLM_MODEL_QUEUE_TIMEOUT = float(os.environ.get('LLM_MODEL_QUEUE_TIMEOUT', 5))  # seconds a chat request waits for a slot
+    LLM_MODEL_LIMITS = os.environ.get('LLM_MODEL_LIMITS', '')  # per model, e.g. 'qwen2:7b=1/4,llama3.1:8b=2'
+    
+    # Chat History Configuration
+    CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get('CHAT_HISTORY_MAX_MESSAGES', 10))
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', 1500))
+    CHAT_SUMMARY_ENABLED = os.environ.get('CHAT_SUMMARY_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get('CHAT_SUMMARY_MAX_TOKENS', 300))
+    
+    # LLM Job Queue Configuration
+    LLM_JOB_BACKEND = os.environ.get('LLM_JOB_BACKEND', 'auto')  # 'auto', 'redis' or 'memory'
+    LLM_JOB_WORKERS = int(os.environ.get('LLM_JOB_WORKERS', 2))
+    LLM_JOB_QUEUE_SIZE = int(os.environ.get('LLM_JOB_QUEUE_SIZE', 100))
+    LLM_JOB_TIMEOUT = int(os.environ.get('LLM_JOB_TIMEOUT', 600))  # seconds after which a running job is requeued on startup
+    LLM_JOB_CALLBACK_HOSTS = [host.strip() for host in os.environ.get('LLM_JOB_CALLBACK_HOSTS', '').split(',') if host.strip()]
+    
+    # Token Revocation Cache Configuration
+    REVOCATION_CACHE_BACKEND = os.environ.get('REVOCATION_CACHE_BACKEND', 'auto')  # 'auto', 'redis' or 'memory'
+    REVOCATION_CACHE_TTL = int(os.environ.get('REVOCATION_CACHE_TTL', 30))  # seconds, 0 disables
+    REVOCATION_CACHE_SIZE = int(os.environ.get('REVOCATION_CACHE_SIZE', 10000))
+    
+    # User Cache Configuration
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'auto')  # 'auto', 'redis' or 'memory'
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # seconds, 0 disables
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    
+    # Settings Cache Configuration
+    SETTINGS_CACHE_BACKEND = os.environ.get('SETTINGS_CACHE_BACKEND', 'auto')  # 'auto', 'redis', 'database' or 'none'
+    SETTINGS_CACHE_CHECK_INTERVAL = float(os.environ.get('SETTINGS_CACHE_CHECK_INTERVAL', 1.0))  # seconds between version checks
+    
+    # Audit Log Configuration
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'true').lower() in ['true', '1', 'yes']
+    AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+    AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 100))
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 1.0))  # seconds
+    AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', 180))  # 0 keeps entries forever
+    AUDIT_ARCHIVE_PATH = os.environ.get('AUDIT_ARCHIVE_PATH', 'data/audit_archive')
+    AUDIT_RETENTION_INTERVAL = int(os.environ.get('AUDIT_RETENTION_INTERVAL', 86400))  # seconds, 0 runs only from the CLI
+    AUDIT_PARTITIONS_AHEAD = int(os.environ.get('AUDIT_PARTITIONS_AHEAD', 2))  # months of PostgreSQL partitions created ahead
+    
+    # Ticket Number Configuration
+    TICKET_NUMBER_BLOCK_SIZE = int(os.environ.get('TICKET_NUMBER_BLOCK_SIZE', 1))  # numbers reserved per process at a time
+    
+    # Statistics Configuration
+    TICKET_COUNTERS_ENABLED = os.environ.get('TICKET_COUNTERS_ENABLED', 'false').lower() in ['true', '1', 'yes']
+    
+    # Article View Counter Configuration
+    VIEW_COUNTER_BACKEND = os.environ.get('VIEW_COUNTER_BACKEND', 'auto')  # 'auto', 'redis', 'memory' or 'none'
+    VIEW_COUNTER_FLUSH_INTERVAL = float(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 10.0))  # seconds
+    
+    # Answer Cache Configuration
+    ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 1000))
+    ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 3600))
+    
+    # Knowledge Search Configuration
+    FULLTEXT_BACKEND = os.environ.get('FULLTEXT_BACKEND', 'auto')  # 'auto', 'postgres', 'sqlite' or 'none'
+    FULLTEXT_PG_CONFIG = os.environ.get('FULLTEXT_PG_CONFIG', 'simple')
+    KNOWLEDGE_SEARCH_ENGINE = os.environ.get('KNOWLEDGE_SEARCH_ENGINE', 'database')  # 'database', 'ngram' or 'bm25'
+    NGRAM_LANGUAGES = os.environ.get('NGRAM_LANGUAGES', 'ja,zh')  # languages tokenized into CJK n-grams
+    NGRAM_SIZE = int(os.environ.get('NGRAM_SIZE', 2))
+    SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', 'data/search_index')
+    SEARCH_INDEX_SNAPSHOT_INTERVAL = int(os.environ.get('SEARCH_INDEX_SNAPSHOT_INTERVAL', 60))  # seconds
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'ollama')  # 'ollama' or 'hashing'
+    EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'bge-m3')
+    VECTOR_INDEX_PATH = os.environ.get('VECTOR_INDEX_PATH', 'data/vector_index')
+    VECTOR_INDEX_CHUNK_SIZE = int(os.environ.get('VECTOR_INDEX_CHUNK_SIZE', 500))
+    VECTOR_INDEX_CHUNK_OVERLAP = int(os.environ.get('VECTOR_INDEX_CHUNK_OVERLAP', 50))
+    VECTOR_INDEX_MIN_SCORE = float(os.environ.get('VECTOR_INDEX_MIN_SCORE', 0.3))
+    KNOWLEDGE_RETRIEVAL_MODE = os.environ.get('KNOWLEDGE_RETRIEVAL_MODE', 'lexical')  # 'lexical', 'vector' or 'hybrid'
+    RETRIEVAL_CANDIDATES = int(os.environ.get('RETRIEVAL_CANDIDATES', 10))
+    RETRIEVAL_MAX_ARTICLES = int(os.environ.get('RETRIEVAL_MAX_ARTICLES', 3))
+    RETRIEVAL_TOKEN_BUDGET = int(os.environ.get('RETRIEVAL_TOKEN_BUDGET', 1500))
     
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -75,6 +165,12 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    EMBEDDING_BACKEND = 'hashing'
+    VECTOR_INDEX_PATH = None
+    SEARCH_INDEX_PATH = None
+    AUDIT_LOG_ASYNC = False  # an in-memory database is not shared with the writer thread
+    AUDIT_ARCHIVE_PATH = None
+    VIEW_COUNTER_BACKEND = 'none'  # views are written synchronously against the in-memory database
 
 class ProductionConfig(Config):
     """Production configuration."""
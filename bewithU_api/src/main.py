@@ -32,14 +32,40 @@ def create_app(config_name=None):
     # Initialize database
     db = init_db(app)
     
+    # Initialize shared LLM client
+    from src.services import llm_client
+    llm_client.init_app(app)
+    
+    # Route chat requests to models and limit concurrent generations per model
+    from src.services import model_router
+    model_router.init_app(app)
+    
+    # Cache token revocation checks, user lookups and system settings
+    from src.services import revocation_cache, settings_cache, user_cache
+    revocation_cache.init_app(app)
+    user_cache.init_app(app)
+    settings_cache.init_app(app)
+    
+    # Track knowledge article changes for caches and search indexes
+    from src.services import knowledge_events, answer_cache
+    knowledge_events.init_app(app)
+    answer_cache.init_app(app)
+    
     # JWT configuration
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """Check if JWT token is revoked."""
         jti = jwt_payload['jti']
+        cache = revocation_cache.get_revocation_cache()
+        if cache is not None and cache.is_valid(jti):
+            return False
+        
         # Check if token exists in database and is not expired
         session = UserSession.query.filter_by(token_hash=jti).first()
-        return session is None or session.is_expired()
+        revoked = session is None or session.is_expired()
+        if not revoked and cache is not None:
+            cache.remember(jti, session.user_id, session.expires_at)
+        return revoked
     
     @jwt.user_identity_loader
     def user_identity_lookup(user):
@@ -50,6 +76,9 @@ def create_app(config_name=None):
     def user_lookup_callback(_jwt_header, jwt_data):
         """Load user from JWT."""
         identity = jwt_data["sub"]
+        cache = user_cache.get_user_cache()
+        if cache is not None:
+            return cache.load(identity)
         return User.query.get(identity)
     
     # Error handlers
@@ -179,6 +208,41 @@ def create_app(config_name=None):
             if not SystemSetting.query.get(key):
                 SystemSetting.set_setting(key, value, description, data_type, is_public)
     
+    # Keep conversation summaries on older databases
+    from src.services import conversation_summary
+    conversation_summary.init_app(app)
+    
+    # Allocate ticket numbers from a database sequence or counter row
+    from src.services import ticket_numbers
+    ticket_numbers.init_app(app)
+    
+    # Maintain ticket counters for dashboards when enabled
+    from src.services import stats
+    stats.init_app(app)
+    
+    # Build knowledge search indexes
+    from src.services import fulltext
+    fulltext.init_app(app)
+    if app.config['KNOWLEDGE_SEARCH_ENGINE'] in ('ngram', 'bm25'):
+        from src.services import search_index
+        search_index.init_app(app)
+    if app.config['KNOWLEDGE_RETRIEVAL_MODE'] in ('vector', 'hybrid'):
+        from src.services import vector_index
+        vector_index.init_app(app)
+    
+    # Write audit logs in batches off the request path and archive expired months
+    from src.services import audit_retention, audit_writer
+    audit_retention.init_app(app)
+    audit_writer.init_app(app)
+    
+    # Add article views to the database in periodic bulk updates
+    from src.services import view_counter
+    view_counter.init_app(app)
+    
+    # Start background LLM workers
+    from src.services import llm_jobs
+    llm_jobs.init_app(app)
+    
     return app
 
 # Create app instance
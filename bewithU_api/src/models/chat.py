@@ -12,9 +12,21 @@ class ChatConversation(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
     title = db.Column(db.String(255))
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    # Summary of the messages, maintained by record_messages
+    message_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    last_message_at = db.Column(db.DateTime(timezone=True))
+    last_message_preview = db.Column(db.Text)
+    # Running summary of the messages up to summarized_until, maintained by services.conversation_memory
+    summary = db.Column(db.Text)
+    summarized_until = db.Column(db.DateTime(timezone=True))
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
+    # Serves the conversation list: a user's conversations, most recent first
+    __table_args__ = (
+        db.Index('ix_chat_conversations_user_updated', 'user_id', 'is_active', 'updated_at'),
+    )
+    
     # Relationships
     messages = db.relationship('ChatMessage', backref='conversation', lazy='dynamic', cascade='all, delete-orphan', order_by='ChatMessage.created_at')
     
@@ -29,17 +41,29 @@ class ChatConversation(db.Model):
         """Get the last message in conversation."""
         return self.messages.order_by(ChatMessage.created_at.desc()).first()
     
-    def generate_title(self):
-        """Generate title from first user message."""
-        first_user_message = self.messages.filter_by(role='user').first()
-        if first_user_message:
-            # Take first 50 characters of the message
-            content = first_user_message.content[:50]
-            if len(first_user_message.content) > 50:
-                content += '...'
-            self.title = content
-            db.session.commit()
-        return self.title
+    @staticmethod
+    def make_title(content):
+        """Make a conversation title from a user message."""
+        # Take first 50 characters of the message
+        title = content[:50]
+        if len(content) > 50:
+            title += '...'
+        return title
+    
+    def record_messages(self, messages):
+        """Update the timestamp, message summary and title for new messages, without committing."""
+        last_message = messages[-1]
+        self.updated_at = last_message.created_at
+        # Incremented in SQL so concurrent messages are all counted
+        self.message_count = ChatConversation.message_count + len(messages)
+        self.last_message_at = last_message.created_at
+        self.last_message_preview = last_message.get_preview()
+        
+        # Title the conversation after its first user message
+        if not self.title:
+            first_user_message = next((message for message in messages if message.role == 'user'), None)
+            if first_user_message:
+                self.title = ChatConversation.make_title(first_user_message.content)
     
     def archive(self):
         """Archive the conversation."""
@@ -53,16 +77,14 @@ class ChatConversation(db.Model):
     
     def to_dict(self, include_messages=False):
         """Convert conversation to dictionary."""
-        last_message = self.get_last_message()
-        
         data = {
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title or 'New Conversation',
             'is_active': self.is_active,
-            'message_count': self.get_message_count(),
-            'last_message_at': last_message.created_at.isoformat() if last_message else None,
-            'last_message_preview': last_message.content[:100] + '...' if last_message and len(last_message.content) > 100 else last_message.content if last_message else None,
+            'message_count': self.message_count or 0,
+            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
+            'last_message_preview': self.last_message_preview,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -111,6 +133,10 @@ class ChatMessage(db.Model):
         """Get character count of the message."""
         return len(self.content)
     
+    def get_preview(self):
+        """Get the preview shown in conversation lists."""
+        return self.content[:100] + '...' if len(self.content) > 100 else self.content
+    
     def to_dict(self):
         """Convert message to dictionary."""
         return {
@@ -125,27 +151,16 @@ class ChatMessage(db.Model):
         }
     
     @staticmethod
-    def create_message(conversation_id, role, content, metadata=None):
-        """Create a new message."""
-        message = ChatMessage(
+    def build(conversation_id, role, content, metadata=None, created_at=None):
+        """Build a message with its id and timestamp set, without adding it to the session."""
+        return ChatMessage(
+            id=str(uuid.uuid4()),
             conversation_id=conversation_id,
             role=role,
             content=content,
-            message_metadata=metadata or {}
+            message_metadata=metadata or {},
+            created_at=created_at or datetime.now(timezone.utc)
         )
-        db.session.add(message)
-        
-        # Update conversation's updated_at timestamp
-        conversation = ChatConversation.query.get(conversation_id)
-        if conversation:
-            conversation.updated_at = datetime.now(timezone.utc)
-            
-            # Generate title if this is the first user message and no title exists
-            if not conversation.title and role == 'user':
-                conversation.generate_title()
-        
-        db.session.commit()
-        return message
 
 class ChatTemplate(db.Model):
     """Chat template model for predefined responses."""
@@ -202,3 +217,56 @@ class ChatTemplate(db.Model):
     # Relationship to creator
     creator = db.relationship('User', foreign_keys=[created_by])
 
+
+class ChatJob(db.Model):
+    """Asynchronous LLM generation job for a chat message."""
+    
+    __tablename__ = 'chat_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    conversation_id = db.Column(db.String(36), db.ForeignKey('chat_conversations.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_message_id = db.Column(db.String(36), db.ForeignKey('chat_messages.id'), nullable=False)
+    assistant_message_id = db.Column(db.String(36), db.ForeignKey('chat_messages.id'))
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)
+    error_message = db.Column(db.Text)
+    callback_url = db.Column(db.Text)
+    ip_address = db.Column(db.String(45))  # IPv6 compatible
+    user_agent = db.Column(db.Text)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    started_at = db.Column(db.DateTime(timezone=True))
+    completed_at = db.Column(db.DateTime(timezone=True))
+    
+    # Relationships
+    user_message = db.relationship('ChatMessage', foreign_keys=[user_message_id])
+    assistant_message = db.relationship('ChatMessage', foreign_keys=[assistant_message_id])
+    
+    # Status choices
+    STATUS_CHOICES = ['queued', 'running', 'completed', 'failed']
+    
+    def __repr__(self):
+        return f'<ChatJob {self.id}: {self.status}>'
+    
+    def is_finished(self):
+        """Check if job has finished."""
+        return self.status in ['completed', 'failed']
+    
+    def to_dict(self, include_messages=False):
+        """Convert job to dictionary."""
+        data = {
+            'id': self.id,
+            'conversation_id': self.conversation_id,
+            'user_message_id': self.user_message_id,
+            'assistant_message_id': self.assistant_message_id,
+            'status': self.status,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+        
+        if include_messages:
+            data['user_message'] = self.user_message.to_dict() if self.user_message else None
+            data['assistant_message'] = self.assistant_message.to_dict() if self.assistant_message else None
+            
+        return data
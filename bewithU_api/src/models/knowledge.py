@@ -1,5 +1,7 @@
 import uuid
 from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy.orm.attributes import set_committed_value
 from . import db
 
 # Association table for many-to-many relationship between articles and tags
@@ -102,8 +104,17 @@ class KnowledgeArticle(db.Model):
     
     def increment_view_count(self):
         """Increment view count."""
-        self.view_count += 1
-        db.session.commit()
+        counter = current_app.extensions.get('view_counter') if has_app_context() else None
+        if counter is None:
+            # Increment in SQL so concurrent views are not lost
+            self.view_count = KnowledgeArticle.view_count + 1
+            db.session.commit()
+            return
+        
+        # The view is written later in a bulk update; the loaded article shows
+        # it right away without marking the row as changed
+        counter.record(self.id)
+        set_committed_value(self, 'view_count', (self.view_count or 0) + 1)
     
     def to_dict(self, include_content=True):
         """Convert article to dictionary."""
@@ -142,7 +153,18 @@ class KnowledgeArticle(db.Model):
             articles = articles.filter_by(language=language)
             
         if query:
-            # Simple text search - in production, consider using full-text search
+            # Relevance-ranked search through the in-process index (published
+            # articles only) or the configured full-text backend
+            search_index = current_app.extensions.get('search_index')
+            if search_index is not None and search_index.ready and status == 'published':
+                return search_index.apply(articles, query, language)
+            
+            fulltext = current_app.extensions.get('fulltext')
+            ranked = fulltext.apply(articles, query) if fulltext is not None else None
+            if ranked is not None:
+                return ranked
+            
+            # Simple text search when no full-text backend can serve the query
             articles = articles.filter(
                 db.or_(
                     KnowledgeArticle.title.contains(query),
@@ -1,6 +1,7 @@
 import uuid
 import json
 from datetime import datetime, timezone
+from flask import current_app, has_app_context
 from . import db
 
 class SystemSetting(db.Model):
@@ -24,20 +25,25 @@ class SystemSetting(db.Model):
     
     def get_typed_value(self):
         """Get value converted to appropriate type."""
-        if self.data_type == 'integer':
+        return SystemSetting.convert_value(self.value, self.data_type)
+    
+    @staticmethod
+    def convert_value(value, data_type):
+        """Convert a stored value to the given data type."""
+        if data_type == 'integer':
             try:
-                return int(self.value)
+                return int(value)
             except (ValueError, TypeError):
                 return 0
-        elif self.data_type == 'boolean':
-            return self.value.lower() in ['true', '1', 'yes', 'on'] if self.value else False
-        elif self.data_type == 'json':
+        elif data_type == 'boolean':
+            return value.lower() in ['true', '1', 'yes', 'on'] if value else False
+        elif data_type == 'json':
             try:
-                return json.loads(self.value) if self.value else {}
+                return json.loads(value) if value else {}
             except json.JSONDecodeError:
                 return {}
         else:
-            return self.value or ''
+            return value or ''
     
     def set_typed_value(self, value):
         """Set value with type conversion."""
@@ -63,6 +69,10 @@ class SystemSetting(db.Model):
     @staticmethod
     def get_setting(key, default=None):
         """Get setting value by key."""
+        cache = current_app.extensions.get('settings_cache') if has_app_context() else None
+        if cache is not None:
+            return cache.get(key, default)
+        
         setting = SystemSetting.query.get(key)
         if setting:
             return setting.get_typed_value()
@@ -92,6 +102,8 @@ class AuditLog(db.Model):
     """Audit log model for tracking user actions."""
     
     __tablename__ = 'audit_logs'
+    # Monthly range partitions on PostgreSQL, managed by services.audit_retention
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), index=True)
@@ -102,7 +114,8 @@ class AuditLog(db.Model):
     new_values = db.Column(db.JSON)
     ip_address = db.Column(db.String(45))  # IPv6 compatible
     user_agent = db.Column(db.Text)
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    # Part of the key because PostgreSQL requires the partition column in it
+    created_at = db.Column(db.DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc), index=True)
     
     def __repr__(self):
         return f'<AuditLog {self.action} on {self.resource_type}>'
@@ -124,9 +137,10 @@ class AuditLog(db.Model):
         }
     
     @staticmethod
-    def log_action(user_id, action, resource_type, resource_id=None, old_values=None, new_values=None, ip_address=None, user_agent=None):
-        """Create audit log entry."""
+    def log_action(user_id, action, resource_type, resource_id=None, old_values=None, new_values=None, ip_address=None, user_agent=None, commit=True):
+        """Create audit log entry; with commit=False it is written with the caller's transaction."""
         log = AuditLog(
+            id=str(uuid.uuid4()),
             user_id=user_id,
             action=action,
             resource_type=resource_type,
@@ -134,10 +148,23 @@ class AuditLog(db.Model):
             old_values=old_values,
             new_values=new_values,
             ip_address=ip_address,
-            user_agent=user_agent
+            user_agent=user_agent,
+            created_at=datetime.now(timezone.utc)
         )
-        db.session.add(log)
-        db.session.commit()
+        
+        # Hand the entry to the batch writer; callers commit their own changes
+        writer = current_app.extensions.get('audit_writer') if has_app_context() else None
+        if writer is not None:
+            entry = {column.name: getattr(log, column.name) for column in AuditLog.__table__.columns}
+            if commit:
+                writer.submit(entry)
+            else:
+                # Submitted once the session commits, dropped if it rolls back
+                db.session.info.setdefault('audit_entries', []).append(entry)
+        else:
+            db.session.add(log)
+            if commit:
+                db.session.commit()
         return log
 
 class SystemHealth(db.Model):
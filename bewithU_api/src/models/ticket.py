@@ -1,6 +1,9 @@
 import uuid
 from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import and_, func
 from . import db
+from .user import User
 
 class Ticket(db.Model):
     """Support ticket model."""
@@ -11,8 +14,9 @@ class Ticket(db.Model):
     ticket_number = db.Column(db.String(20), unique=True, nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='open', nullable=False, index=True)
-    priority = db.Column(db.String(20), default='normal', nullable=False, index=True)
+    # active_history loads the previous value on change, so ticket counters can move it
+    status = db.column_property(db.Column(db.String(20), default='open', nullable=False, index=True), active_history=True)
+    priority = db.column_property(db.Column(db.String(20), default='normal', nullable=False, index=True), active_history=True)
     category = db.Column(db.String(50), index=True)
     requester_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
     assignee_id = db.Column(db.String(36), db.ForeignKey('users.id'), index=True)
@@ -40,18 +44,8 @@ class Ticket(db.Model):
     @staticmethod
     def generate_ticket_number():
         """Generate unique ticket number."""
-        # Get the latest ticket number
-        latest_ticket = Ticket.query.order_by(Ticket.created_at.desc()).first()
-        if latest_ticket and latest_ticket.ticket_number:
-            try:
-                # Extract number from format T-000001
-                number = int(latest_ticket.ticket_number.split('-')[1]) + 1
-            except (IndexError, ValueError):
-                number = 1
-        else:
-            number = 1
-        
-        return f'T-{number:06d}'
+        # Allocated by the database, so concurrent requests never get the same number
+        return f'T-{current_app.extensions["ticket_numbers"].allocate():06d}'
     
     def assign_to(self, user_id):
         """Assign ticket to a user."""
@@ -80,15 +74,48 @@ class Ticket(db.Model):
         self.closed_at = None
         db.session.commit()
     
-    def get_response_time(self):
+    def get_response_time(self, first_comments=None):
         """Get response time in hours."""
-        if self.comments.count() > 0:
+        if first_comments is not None:
+            first_response = first_comments.get(self.id)
+        else:
             first_response = self.comments.first()
-            if first_response and first_response.author_id != self.requester_id:
-                delta = first_response.created_at - self.created_at
-                return delta.total_seconds() / 3600
+        if first_response and first_response.author_id != self.requester_id:
+            delta = first_response.created_at - self.created_at
+            return delta.total_seconds() / 3600
         return None
     
+    @staticmethod
+    def get_first_comments(ticket_ids):
+        """Get the first comment (author_id, created_at) of each ticket in one grouped query."""
+        first = db.session.query(
+            TicketComment.ticket_id,
+            func.min(TicketComment.created_at).label('created_at')
+        ).filter(TicketComment.ticket_id.in_(ticket_ids)).group_by(TicketComment.ticket_id).subquery()
+        
+        rows = db.session.query(TicketComment.ticket_id, TicketComment.author_id, TicketComment.created_at).join(
+            first,
+            and_(TicketComment.ticket_id == first.c.ticket_id, TicketComment.created_at == first.c.created_at)
+        )
+        first_comments = {}
+        for row in rows:
+            first_comments.setdefault(row.ticket_id, row)
+        return first_comments
+    
+    @staticmethod
+    def to_dict_list(tickets):
+        """Convert a page of tickets to dictionaries with a fixed number of queries."""
+        if not tickets:
+            return []
+        
+        # Loading requesters and assignees up front puts them in the identity
+        # map, so ticket.requester/assignee resolve without a query per row
+        user_ids = {ticket.requester_id for ticket in tickets} | {ticket.assignee_id for ticket in tickets if ticket.assignee_id}
+        users = User.query.filter(User.id.in_(user_ids)).all()
+        
+        first_comments = Ticket.get_first_comments([ticket.id for ticket in tickets])
+        return [ticket.to_dict(first_comments=first_comments) for ticket in tickets]
+    
     def get_resolution_time(self):
         """Get resolution time in hours."""
         if self.resolved_at:
@@ -96,7 +123,7 @@ class Ticket(db.Model):
             return delta.total_seconds() / 3600
         return None
     
-    def to_dict(self, include_comments=False, include_attachments=False):
+    def to_dict(self, include_comments=False, include_attachments=False, first_comments=None):
         """Convert ticket to dictionary."""
         data = {
             'id': self.id,
@@ -110,7 +137,7 @@ class Ticket(db.Model):
             'requester_name': self.requester.display_name if self.requester else None,
             'assignee_id': self.assignee_id,
             'assignee_name': self.assignee.display_name if self.assignee else None,
-            'response_time': self.get_response_time(),
+            'response_time': self.get_response_time(first_comments),
             'resolution_time': self.get_resolution_time(),
             'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
             'closed_at': self.closed_at.isoformat() if self.closed_at else None,
@@ -126,6 +153,29 @@ class Ticket(db.Model):
             
         return data
 
+class TicketCounter(db.Model):
+    """Ticket count per status and priority, maintained incrementally."""
+    
+    __tablename__ = 'ticket_counters'
+    
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<TicketCounter {self.status}/{self.priority}: {self.count}>'
+
+class TicketSequence(db.Model):
+    """Last allocated number of a named sequence, for databases without sequences."""
+    
+    __tablename__ = 'ticket_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<TicketSequence {self.name}: {self.value}>'
+
 class TicketComment(db.Model):
     """Ticket comment model."""
     
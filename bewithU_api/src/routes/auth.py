@@ -10,6 +10,7 @@ import hashlib
 from src.models import db
 from src.models.user import User, UserSession
 from src.models.system import AuditLog
+from src.services.revocation_cache import invalidate_user_on_commit
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -298,6 +299,9 @@ def change_password():
             UserSession.token_hash != jti
         ).delete()
         
+        # Bulk deletes bypass the session listeners, so drop cached tokens on commit
+        invalidate_user_on_commit(user.id)
+        
         # Log password change
         ip_address, user_agent = get_client_info()
         AuditLog.log_action(
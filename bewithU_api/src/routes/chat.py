@@ -1,12 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, current_user
-import requests
+import queue
 import json
+import time
 
 from src.models import db
-from src.models.chat import ChatConversation, ChatMessage, ChatTemplate
-from src.models.knowledge import KnowledgeArticle
-from src.models.system import AuditLog, SystemSetting
+from src.models.chat import ChatConversation, ChatMessage, ChatTemplate, ChatJob
+from src.models.system import AuditLog
+from src.services.chat_service import (
+    search_knowledge_base, stream_ollama_api, build_llm_messages,
+    generate_response, get_cached_response, cache_response, is_opening_question,
+    build_fallback_response, llm_unavailable
+)
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.chat_turn import ChatTurn
+from src.services.llm_jobs import get_worker_pool, is_allowed_callback
+from src.services.model_router import ModelBusy, get_model_router
+from src.services.pagination import InvalidCursor, paginate
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -16,67 +26,20 @@ def get_client_info():
     user_agent = request.headers.get('User-Agent', '')
     return ip_address, user_agent
 
-def search_knowledge_base(query, language='ja'):
-    """Search knowledge base for relevant information."""
-    try:
-        # Search published articles
-        articles = KnowledgeArticle.search(
-            query=query,
-            language=language,
-            status='published'
-        ).limit(3).all()
-        
-        results = []
-        for article in articles:
-            results.append({
-                'id': article.id,
-                'title': article.title,
-                'summary': article.summary,
-                'content_preview': article.content[:200] + '...' if len(article.content) > 200 else article.content,
-                'url': f'/knowledge/articles/{article.id}'
-            })
-        
-        return results
-    except Exception as e:
-        print(f"Knowledge search error: {e}")
-        return []
+def format_sse(event, data):
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-def call_ollama_api(messages, model=None):
-    """Call Ollama API for LLM response."""
-    try:
-        ollama_url = SystemSetting.get_setting('ollama_base_url', 'http://localhost:11434')
-        model = model or SystemSetting.get_setting('default_llm_model', 'llama2')
-        
-        # Format messages for Ollama
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                'role': msg['role'],
-                'content': msg['content']
-            })
-        
-        payload = {
-            'model': model,
-            'messages': formatted_messages,
-            'stream': False
-        }
-        
-        response = requests.post(
-            f"{ollama_url}/api/chat",
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('message', {}).get('content', 'Sorry, I could not generate a response.')
-        else:
-            return f"Error: LLM service returned status {response.status_code}"
-            
-    except requests.exceptions.RequestException as e:
-        return f"Error: Could not connect to LLM service - {str(e)}"
-    except Exception as e:
-        return f"Error: {str(e)}"
+def model_busy_response(error):
+    """Build the 503 response for a saturated model."""
+    response = jsonify({
+        'error': 'The language model is busy, please retry later',
+        'model': error.model,
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
 # Conversations endpoints
 @chat_bp.route('/conversations', methods=['GET'])
@@ -87,25 +50,19 @@ def get_conversations():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        conversations = ChatConversation.query.filter_by(
+        query = ChatConversation.query.filter_by(
             user_id=current_user.id,
             is_active=True
-        ).order_by(ChatConversation.updated_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
         )
+        conversations, pagination = paginate(query, ChatConversation.updated_at, ChatConversation.id, page, per_page)
         
         return jsonify({
-            'conversations': [conv.to_dict() for conv in conversations.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': conversations.total,
-                'pages': conversations.pages,
-                'has_next': conversations.has_next,
-                'has_prev': conversations.has_prev
-            }
+            'conversations': [conv.to_dict() for conv in conversations],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get conversations', 'details': str(e)}), 500
 
@@ -217,90 +174,42 @@ def send_message(conversation_id):
         if not content:
             return jsonify({'error': 'Message content is required'}), 400
         
-        # Create user message
-        user_message = ChatMessage.create_message(
-            conversation_id=conversation.id,
-            role='user',
-            content=content
-        )
+        # Both messages and the audit entry are stored in one transaction
+        # once the reply is ready
+        turn = ChatTurn(conversation)
+        user_message = turn.add_message('user', content)
         
         # Search knowledge base first
         knowledge_results = search_knowledge_base(content, current_user.language)
         
-        # Prepare context for AI
-        system_prompt = f"""You are BEwithU, an intelligent IT support assistant. You help users with IT-related questions and problems.
-
-Current user language: {current_user.language}
-Please respond in the user's language.
-
-If you find relevant information in the knowledge base, use it to provide accurate answers.
-If you cannot find relevant information, politely explain that you need to create a support ticket for human assistance.
-
-Knowledge base search results for "{content}":
-"""
-        
-        if knowledge_results:
-            system_prompt += "\nRelevant articles found:\n"
-            for result in knowledge_results:
-                system_prompt += f"- {result['title']}: {result['summary']}\n"
-                system_prompt += f"  Preview: {result['content_preview']}\n\n"
-        else:
-            system_prompt += "\nNo relevant articles found in the knowledge base.\n"
-        
-        system_prompt += """
-Based on the above information, please provide a helpful response. If you can answer the question using the knowledge base, do so. If not, suggest creating a support ticket for human assistance.
-"""
-        
-        # Get conversation history for context
-        recent_messages = ChatMessage.query.filter_by(
-            conversation_id=conversation.id
-        ).order_by(ChatMessage.created_at.desc()).limit(10).all()
-        
-        # Prepare messages for LLM
-        llm_messages = [{'role': 'system', 'content': system_prompt}]
-        
-        # Add recent conversation history (in reverse order)
-        for msg in reversed(recent_messages[1:]):  # Skip the just-created user message
-            llm_messages.append({
-                'role': msg.role,
-                'content': msg.content
-            })
-        
-        # Add current user message
-        llm_messages.append({
-            'role': 'user',
-            'content': content
-        })
+        llm_messages, prompt_info = build_llm_messages(conversation, content, knowledge_results, current_user.language, saved=False)
         
-        # Get AI response
-        ai_response = call_ollama_api(llm_messages)
+        # Get AI response (repeated questions are served from the answer cache)
+        ai_response, generation_info = generate_response(
+            llm_messages, content, current_user.language, knowledge_results,
+            opening=is_opening_question(conversation, saved=False)
+        )
         
         # Create assistant message
-        assistant_message = ChatMessage.create_message(
-            conversation_id=conversation.id,
-            role='assistant',
-            content=ai_response,
+        assistant_message = turn.add_message(
+            'assistant',
+            ai_response,
             metadata={
                 'knowledge_results': knowledge_results,
-                'model_used': SystemSetting.get_setting('default_llm_model', 'llama2'),
-                'has_knowledge_match': len(knowledge_results) > 0
+                'model_used': generation_info['model_used'],
+                'has_knowledge_match': len(knowledge_results) > 0,
+                'cache_hit': generation_info['cache_hit'],
+                'fallback': generation_info['fallback'],
+                'prompt_tokens': generation_info['prompt_tokens'],
+                'completion_tokens': generation_info['completion_tokens'],
+                'prompt': prompt_info
             }
         )
         
         # Log chat interaction
         ip_address, user_agent = get_client_info()
-        AuditLog.log_action(
-            user_id=current_user.id,
-            action='chat_message',
-            resource_type='chat_message',
-            resource_id=user_message.id,
-            new_values={
-                'user_message': user_message.to_dict(),
-                'assistant_message': assistant_message.to_dict()
-            },
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+        turn.log(current_user.id, user_message, assistant_message, ip_address, user_agent)
+        turn.commit()
         
         return jsonify({
             'user_message': user_message.to_dict(),
@@ -308,10 +217,264 @@ Based on the above information, please provide a helpful response. If you can an
             'knowledge_results': knowledge_results
         }), 201
         
+    except ModelBusy as e:
+        db.session.rollback()
+        return model_busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Message sending failed', 'details': str(e)}), 500
 
+@chat_bp.route('/conversations/<conversation_id>/messages/stream', methods=['POST'])
+@jwt_required()
+def stream_message(conversation_id):
+    """Send message and stream AI response as Server-Sent Events."""
+    try:
+        conversation = ChatConversation.query.filter_by(
+            id=conversation_id,
+            user_id=current_user.id
+        ).first()
+        
+        if not conversation:
+            return jsonify({'error': 'Conversation not found'}), 404
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        content = data.get('content', '').strip()
+        if not content:
+            return jsonify({'error': 'Message content is required'}), 400
+        
+        # The user message is stored with the assistant message when the
+        # stream ends, so no write transaction stays open while streaming
+        turn = ChatTurn(conversation)
+        user_message = turn.add_message('user', content)
+        
+        # Search knowledge base first
+        knowledge_results = search_knowledge_base(content, current_user.language)
+        llm_messages, prompt_info = build_llm_messages(conversation, content, knowledge_results, current_user.language, saved=False)
+        
+        user_id = current_user.id
+        language = current_user.language
+        router = get_model_router()
+        model = router.select(language, 'chat')
+        opening = is_opening_question(conversation, saved=False)
+        cached = get_cached_response(opening, content, language, knowledge_results)
+        ip_address, user_agent = get_client_info()
+        # Answer from the knowledge base at once while the LLM service is down
+        fallback = cached is None and llm_unavailable()
+        # Take the model slot before the stream starts, so a saturated
+        # model is reported as a 503 rather than an error event
+        slot = router.acquire(model, 'chat') if cached is None and not fallback else None
+        
+    except ModelBusy as e:
+        db.session.rollback()
+        return model_busy_response(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Message sending failed', 'details': str(e)}), 500
+    
+    def save_turn(ai_response, interrupted=False):
+        """Persist the messages and log the interaction in one transaction."""
+        if ai_response is None:
+            turn.commit()
+            return None
+        
+        metadata = {
+            'knowledge_results': knowledge_results,
+            'model_used': cached['model_used'] if cached else None if fallback else model,
+            'has_knowledge_match': len(knowledge_results) > 0,
+            'cache_hit': cached is not None,
+            'fallback': fallback,
+            'streamed': True,
+            'prompt_tokens': usage['prompt_tokens'],
+            'completion_tokens': usage['completion_tokens'],
+            'prompt': prompt_info
+        }
+        if interrupted:
+            metadata['interrupted'] = True
+        
+        assistant_message = turn.add_message('assistant', ai_response, metadata=metadata)
+        turn.log(user_id, user_message, assistant_message, ip_address, user_agent)
+        turn.commit()
+        return assistant_message
+    
+    # Filled in from the final chunk of the stream
+    usage = {'prompt_tokens': None, 'completion_tokens': None}
+    
+    def generate():
+        nonlocal fallback
+        yield format_sse('user_message', user_message.to_dict())
+        yield format_sse('knowledge_results', knowledge_results)
+        
+        chunks = []
+        try:
+            if cached:
+                ai_response = cached['content']
+                yield format_sse('token', {'content': ai_response})
+            elif fallback:
+                ai_response = build_fallback_response(knowledge_results, language)
+                yield format_sse('token', {'content': ai_response})
+            else:
+                try:
+                    for chunk in stream_ollama_api(llm_messages, model=model, usage=usage):
+                        chunks.append(chunk)
+                        yield format_sse('token', {'content': chunk})
+                finally:
+                    slot.release()
+                ai_response = ''.join(chunks) or 'Sorry, I could not generate a response.'
+                cache_response(opening, content, language, knowledge_results, ai_response, model)
+        except GeneratorExit:
+            # Client went away; keep the question and whatever was generated so far
+            save_turn(''.join(chunks) if chunks else None, interrupted=True)
+            raise
+        except Exception as e:
+            # Also when the circuit opened while this request waited for its
+            # slot; the error text is not for users
+            if not isinstance(e, CircuitOpenError):
+                print(f"LLM streaming error: {e}")
+            fallback = True
+            ai_response = build_fallback_response(knowledge_results, language)
+            yield format_sse('token', {'content': ai_response})
+        
+        try:
+            assistant_message = save_turn(ai_response)
+        except Exception as e:
+            db.session.rollback()
+            yield format_sse('error', {'error': 'Message saving failed', 'details': str(e)})
+            return
+        
+        yield format_sse('assistant_message', assistant_message.to_dict())
+        yield format_sse('done', {'message_id': assistant_message.id})
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    if slot is not None:
+        # Also frees the slot if the client leaves before the stream starts
+        response.call_on_close(slot.release)
+    return response
+
+@chat_bp.route('/conversations/<conversation_id>/messages/async', methods=['POST'])
+@jwt_required()
+def send_message_async(conversation_id):
+    """Send message and queue AI response generation as a background job."""
+    try:
+        conversation = ChatConversation.query.filter_by(
+            id=conversation_id,
+            user_id=current_user.id
+        ).first()
+        
+        if not conversation:
+            return jsonify({'error': 'Conversation not found'}), 404
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        content = data.get('content', '').strip()
+        if not content:
+            return jsonify({'error': 'Message content is required'}), 400
+        
+        callback_url = (data.get('callback_url') or '').strip() or None
+        if callback_url and not is_allowed_callback(callback_url):
+            return jsonify({'error': 'Callback URL is not allowed'}), 400
+        
+        # Store the user message and its job together
+        turn = ChatTurn(conversation)
+        user_message = turn.add_message('user', content)
+        
+        ip_address, user_agent = get_client_info()
+        job = turn.add(ChatJob(
+            conversation_id=conversation.id,
+            user_id=current_user.id,
+            user_message_id=user_message.id,
+            callback_url=callback_url,
+            ip_address=ip_address,
+            user_agent=user_agent
+        ))
+        turn.commit()
+        
+        try:
+            get_worker_pool().submit('chat', job.id)
+        except queue.Full:
+            job.status = 'failed'
+            job.error_message = 'Job queue is full'
+            db.session.commit()
+            return jsonify({'error': 'Job queue is full, please retry later', 'job': job.to_dict()}), 503
+        
+        response = jsonify({
+            'job': job.to_dict(),
+            'user_message': user_message.to_dict()
+        })
+        response.status_code = 202
+        response.headers['Location'] = f'/api/chat/jobs/{job.id}'
+        return response
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Message sending failed', 'details': str(e)}), 500
+
+# Jobs endpoints
+@chat_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get status of a chat generation job."""
+    try:
+        job = ChatJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({'job': job.to_dict(include_messages=True)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get job', 'details': str(e)}), 500
+
+@chat_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def subscribe_job(job_id):
+    """Subscribe to a chat generation job as Server-Sent Events."""
+    job = ChatJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    timeout = request.args.get('timeout', 120, type=int)
+    
+    def generate():
+        deadline = time.monotonic() + min(timeout, 300)
+        last_status = None
+        while True:
+            # Read committed state written by the worker
+            db.session.expire_all()
+            current = ChatJob.query.get(job_id)
+            if current.status != last_status:
+                last_status = current.status
+                yield format_sse('status', {'status': current.status})
+            
+            if current.is_finished():
+                yield format_sse('job', current.to_dict(include_messages=True))
+                return
+            
+            if time.monotonic() > deadline:
+                yield format_sse('timeout', {'job_id': job_id})
+                return
+            
+            time.sleep(0.5)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 # Templates endpoints
 @chat_bp.route('/templates', methods=['GET'])
 @jwt_required()
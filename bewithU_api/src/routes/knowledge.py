@@ -5,6 +5,7 @@ from sqlalchemy import or_
 from src.models import db
 from src.models.knowledge import KnowledgeCategory, KnowledgeArticle, KnowledgeTag
 from src.models.system import AuditLog
+from src.services.pagination import InvalidCursor, paginate
 
 knowledge_bp = Blueprint('knowledge', __name__)
 
@@ -120,22 +121,15 @@ def get_articles():
             query = query.filter_by(is_featured=True)
         
         # Paginate results
-        articles = query.order_by(KnowledgeArticle.updated_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        articles, pagination = paginate(query, KnowledgeArticle.updated_at, KnowledgeArticle.id, page, per_page)
         
         return jsonify({
-            'articles': [article.to_dict(include_content=False) for article in articles.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': articles.total,
-                'pages': articles.pages,
-                'has_next': articles.has_next,
-                'has_prev': articles.has_prev
-            }
+            'articles': [article.to_dict(include_content=False) for article in articles],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get articles', 'details': str(e)}), 500
 
@@ -297,23 +291,17 @@ def search_knowledge():
             language=language if language else None
         )
         
-        articles = articles_query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Page mode keeps the relevance order, ties broken newest first
+        articles, pagination = paginate(articles_query, KnowledgeArticle.updated_at, KnowledgeArticle.id, page, per_page)
         
         return jsonify({
             'query': query,
-            'articles': [article.to_dict(include_content=False) for article in articles.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': articles.total,
-                'pages': articles.pages,
-                'has_next': articles.has_next,
-                'has_prev': articles.has_prev
-            }
+            'articles': [article.to_dict(include_content=False) for article in articles],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Search failed', 'details': str(e)}), 500
 
@@ -5,9 +5,22 @@ from datetime import datetime, timezone, timedelta
 from src.models import db
 from src.models.system import SystemSetting, AuditLog, SystemHealth, Notification
 from src.models.user import User
-from src.models.ticket import Ticket
-from src.models.knowledge import KnowledgeArticle
-from src.models.chat import ChatConversation
+from src.services.answer_cache import get_answer_cache
+from src.services.audit_retention import get_audit_retention
+from src.services.audit_writer import get_audit_writer
+from src.services.fulltext import get_fulltext_backend
+from src.services.llm_client import get_llm_client
+from src.services.llm_jobs import get_worker_pool
+from src.services.model_router import get_model_router
+from src.services.pagination import InvalidCursor, paginate
+from src.services.revocation_cache import get_revocation_cache
+from src.services.search_index import get_search_index
+from src.services.settings_cache import get_settings_cache
+from src.services.stats import OPEN_STATUSES, count_articles, count_conversations, count_tickets, count_users
+from src.services.ticket_numbers import get_ticket_number_allocator
+from src.services.user_cache import get_user_cache
+from src.services.vector_index import get_vector_index
+from src.services.view_counter import get_view_counter
 
 system_bp = Blueprint('system', __name__)
 
@@ -275,25 +288,93 @@ def get_audit_logs():
         if user_id:
             query = query.filter_by(user_id=user_id)
         
-        logs = query.order_by(AuditLog.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        logs, pagination = paginate(query, AuditLog.created_at, AuditLog.id, page, per_page)
         
         return jsonify({
-            'logs': [log.to_dict() for log in logs.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': logs.total,
-                'pages': logs.pages,
-                'has_next': logs.has_next,
-                'has_prev': logs.has_prev
-            }
+            'logs': [log.to_dict() for log in logs],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get audit logs', 'details': str(e)}), 500
 
+@system_bp.route('/audit-logs/archive', methods=['GET'])
+@jwt_required()
+def search_audit_archive():
+    """Search archived audit logs past the retention period (admin only)."""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    retention = get_audit_retention()
+    if retention is None:
+        return jsonify({'error': 'Audit log archival is not enabled'}), 404
+    
+    try:
+        bounds = {}
+        for name in ['start', 'end']:
+            value = request.args.get(name, '').strip()
+            if value:
+                try:
+                    bounds[name] = datetime.fromisoformat(value)
+                except ValueError:
+                    return jsonify({'error': f'Invalid {name} date'}), 400
+                if bounds[name].tzinfo is None:
+                    bounds[name] = bounds[name].replace(tzinfo=timezone.utc)
+        
+        limit = min(request.args.get('limit', 500, type=int), 5000)
+        logs = retention.archive.search(
+            start=bounds.get('start'),
+            end=bounds.get('end'),
+            user_id=request.args.get('user_id', '').strip() or None,
+            action=request.args.get('action', '').strip() or None,
+            resource_type=request.args.get('resource_type', '').strip() or None,
+            resource_id=request.args.get('resource_id', '').strip() or None,
+            limit=limit + 1
+        )
+        
+        return jsonify({
+            'logs': logs[:limit],
+            'has_more': len(logs) > limit,
+            'archived_months': [month.strftime('%Y-%m') for month in retention.archive.months()]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to search audit log archive', 'details': str(e)}), 500
+
+# Runtime metrics
+@system_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """Get runtime metrics of shared services (admin only)."""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    try:
+        return jsonify({
+            'llm_client': get_llm_client().get_metrics(),
+            'llm_jobs': get_worker_pool().get_metrics(),
+            'model_router': get_model_router().get_stats(),
+            'revocation_cache': get_revocation_cache().get_stats() if get_revocation_cache() is not None else None,
+            'user_cache': get_user_cache().get_stats() if get_user_cache() is not None else None,
+            'settings_cache': get_settings_cache().get_stats() if get_settings_cache() is not None else None,
+            'answer_cache': get_answer_cache().get_stats() if get_answer_cache() else None,
+            'fulltext': get_fulltext_backend().get_stats() if get_fulltext_backend() is not None else None,
+            'search_index': get_search_index().get_stats() if get_search_index() is not None else None,
+            'vector_index': get_vector_index().get_stats() if get_vector_index() is not None else None,
+            'audit_log': get_audit_writer().get_stats() if get_audit_writer() is not None else None,
+            'audit_retention': get_audit_retention().get_stats() if get_audit_retention() is not None else None,
+            'ticket_numbers': get_ticket_number_allocator().get_stats() if get_ticket_number_allocator() is not None else None,
+            'view_counter': get_view_counter().get_stats() if get_view_counter() is not None else None,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get metrics', 'details': str(e)}), 500
+
 # Dashboard statistics
 @system_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
@@ -301,29 +382,22 @@ def get_dashboard_stats():
     """Get dashboard statistics."""
     try:
         if current_user.has_role('admin'):
-            # Admin dashboard - system-wide stats
-            total_users = User.query.count()
-            active_users = User.query.filter_by(is_active=True).count()
-            total_tickets = Ticket.query.count()
-            open_tickets = Ticket.query.filter_by(status='open').count()
-            total_articles = KnowledgeArticle.query.filter_by(status='published').count()
-            total_conversations = ChatConversation.query.filter_by(is_active=True).count()
-            
-            # Recent activity (last 7 days)
+            # Admin dashboard - system-wide stats, one aggregate query per table
             week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-            recent_tickets = Ticket.query.filter(Ticket.created_at >= week_ago).count()
-            recent_articles = KnowledgeArticle.query.filter(KnowledgeArticle.created_at >= week_ago).count()
-            recent_conversations = ChatConversation.query.filter(ChatConversation.created_at >= week_ago).count()
+            total_users, active_users = count_users()
+            tickets = count_tickets(since=week_ago)
+            total_articles, recent_articles = count_articles(since=week_ago)
+            total_conversations, recent_conversations = count_conversations(since=week_ago)
             
             return jsonify({
                 'total_users': total_users,
                 'active_users': active_users,
-                'total_tickets': total_tickets,
-                'open_tickets': open_tickets,
+                'total_tickets': tickets.total(),
+                'open_tickets': tickets.total(statuses=['open']),
                 'total_articles': total_articles,
                 'total_conversations': total_conversations,
                 'recent_activity': {
-                    'tickets': recent_tickets,
+                    'tickets': tickets.recent,
                     'articles': recent_articles,
                     'conversations': recent_conversations
                 }
@@ -331,36 +405,23 @@ def get_dashboard_stats():
             
         elif current_user.has_role('support'):
             # Support dashboard
-            my_assigned_tickets = Ticket.query.filter_by(assignee_id=current_user.id).filter(
-                Ticket.status.in_(['open', 'pending'])
-            ).count()
-            
-            total_open_tickets = Ticket.query.filter_by(status='open').count()
-            total_pending_tickets = Ticket.query.filter_by(status='pending').count()
-            high_priority_tickets = Ticket.query.filter_by(priority='high').filter(
-                Ticket.status.in_(['open', 'pending'])
-            ).count()
+            tickets = count_tickets(assignee_id=current_user.id)
             
             return jsonify({
-                'my_assigned_tickets': my_assigned_tickets,
-                'total_open_tickets': total_open_tickets,
-                'total_pending_tickets': total_pending_tickets,
-                'high_priority_tickets': high_priority_tickets
+                'my_assigned_tickets': tickets.total(statuses=OPEN_STATUSES, assigned=True),
+                'total_open_tickets': tickets.total(statuses=['open']),
+                'total_pending_tickets': tickets.total(statuses=['pending']),
+                'high_priority_tickets': tickets.total(statuses=OPEN_STATUSES, priorities=['high'])
             }), 200
             
         else:
             # User dashboard
-            my_tickets = Ticket.query.filter_by(requester_id=current_user.id)
-            my_open_tickets = my_tickets.filter_by(status='open').count()
-            my_pending_tickets = my_tickets.filter_by(status='pending').count()
-            my_conversations = ChatConversation.query.filter_by(
-                user_id=current_user.id,
-                is_active=True
-            ).count()
+            tickets = count_tickets(requester_id=current_user.id)
+            my_conversations, _ = count_conversations(user_id=current_user.id)
             
             return jsonify({
-                'my_open_tickets': my_open_tickets,
-                'my_pending_tickets': my_pending_tickets,
+                'my_open_tickets': tickets.total(statuses=['open']),
+                'my_pending_tickets': tickets.total(statuses=['pending']),
                 'my_conversations': my_conversations
             }), 200
         
@@ -382,22 +443,15 @@ def get_notifications():
         if unread_only:
             query = query.filter_by(is_read=False)
         
-        notifications = query.order_by(Notification.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        notifications, pagination = paginate(query, Notification.created_at, Notification.id, page, per_page)
         
         return jsonify({
-            'notifications': [notif.to_dict() for notif in notifications.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': notifications.total,
-                'pages': notifications.pages,
-                'has_next': notifications.has_next,
-                'has_prev': notifications.has_prev
-            }
+            'notifications': [notif.to_dict() for notif in notifications],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get notifications', 'details': str(e)}), 500
 
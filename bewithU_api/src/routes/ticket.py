@@ -5,6 +5,8 @@ from sqlalchemy import or_
 from src.models import db
 from src.models.ticket import Ticket, TicketComment, TicketAttachment
 from src.models.system import AuditLog
+from src.services.pagination import InvalidCursor, paginate
+from src.services.stats import OPEN_STATUSES, count_tickets
 
 ticket_bp = Blueprint('tickets', __name__)
 
@@ -59,22 +61,15 @@ def get_tickets():
             )
         
         # Paginate results
-        tickets = query.order_by(Ticket.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        tickets, pagination = paginate(query, Ticket.created_at, Ticket.id, page, per_page)
         
         return jsonify({
-            'tickets': [ticket.to_dict() for ticket in tickets.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': tickets.total,
-                'pages': tickets.pages,
-                'has_next': tickets.has_next,
-                'has_prev': tickets.has_prev
-            }
+            'tickets': Ticket.to_dict_list(tickets),
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get tickets', 'details': str(e)}), 500
 
@@ -373,50 +368,28 @@ def get_ticket_stats():
     try:
         if current_user.has_role('support'):
             # Support users see all tickets
-            total_tickets = Ticket.query.count()
-            open_tickets = Ticket.query.filter_by(status='open').count()
-            pending_tickets = Ticket.query.filter_by(status='pending').count()
-            resolved_tickets = Ticket.query.filter_by(status='resolved').count()
-            closed_tickets = Ticket.query.filter_by(status='closed').count()
-            
-            # Tickets by priority
-            high_priority = Ticket.query.filter_by(priority='high').filter(
-                Ticket.status.in_(['open', 'pending'])
-            ).count()
-            urgent_priority = Ticket.query.filter_by(priority='urgent').filter(
-                Ticket.status.in_(['open', 'pending'])
-            ).count()
-            
-            # My assigned tickets
-            my_assigned = Ticket.query.filter_by(assignee_id=current_user.id).filter(
-                Ticket.status.in_(['open', 'pending'])
-            ).count()
+            counts = count_tickets(assignee_id=current_user.id)
             
             return jsonify({
-                'total_tickets': total_tickets,
-                'open_tickets': open_tickets,
-                'pending_tickets': pending_tickets,
-                'resolved_tickets': resolved_tickets,
-                'closed_tickets': closed_tickets,
-                'high_priority_tickets': high_priority,
-                'urgent_priority_tickets': urgent_priority,
-                'my_assigned_tickets': my_assigned
+                'total_tickets': counts.total(),
+                'open_tickets': counts.total(statuses=['open']),
+                'pending_tickets': counts.total(statuses=['pending']),
+                'resolved_tickets': counts.total(statuses=['resolved']),
+                'closed_tickets': counts.total(statuses=['closed']),
+                'high_priority_tickets': counts.total(statuses=OPEN_STATUSES, priorities=['high']),
+                'urgent_priority_tickets': counts.total(statuses=OPEN_STATUSES, priorities=['urgent']),
+                'my_assigned_tickets': counts.total(statuses=OPEN_STATUSES, assigned=True)
             }), 200
         else:
             # Regular users see only their tickets
-            my_tickets = Ticket.query.filter_by(requester_id=current_user.id)
-            total_tickets = my_tickets.count()
-            open_tickets = my_tickets.filter_by(status='open').count()
-            pending_tickets = my_tickets.filter_by(status='pending').count()
-            resolved_tickets = my_tickets.filter_by(status='resolved').count()
-            closed_tickets = my_tickets.filter_by(status='closed').count()
+            counts = count_tickets(requester_id=current_user.id)
             
             return jsonify({
-                'my_total_tickets': total_tickets,
-                'my_open_tickets': open_tickets,
-                'my_pending_tickets': pending_tickets,
-                'my_resolved_tickets': resolved_tickets,
-                'my_closed_tickets': closed_tickets
+                'my_total_tickets': counts.total(),
+                'my_open_tickets': counts.total(statuses=['open']),
+                'my_pending_tickets': counts.total(statuses=['pending']),
+                'my_resolved_tickets': counts.total(statuses=['resolved']),
+                'my_closed_tickets': counts.total(statuses=['closed'])
             }), 200
         
     except Exception as e:
@@ -5,6 +5,7 @@ from sqlalchemy import or_
 from src.models import db
 from src.models.user import User
 from src.models.system import AuditLog
+from src.services.pagination import InvalidCursor, paginate
 
 user_bp = Blueprint('users', __name__)
 
@@ -55,22 +56,15 @@ def get_users():
             query = query.filter(User.is_active == active_filter)
         
         # Paginate results
-        users = query.order_by(User.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        users, pagination = paginate(query, User.created_at, User.id, page, per_page)
         
         return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': users.total,
-                'pages': users.pages,
-                'has_next': users.has_next,
-                'has_prev': users.has_prev
-            }
+            'users': [user.to_dict() for user in users],
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to get users', 'details': str(e)}), 500
 
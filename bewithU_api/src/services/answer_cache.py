@@ -0,0 +1,91 @@
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from flask import current_app
+
+from src.services import knowledge_events
+from src.services.cache import TTLCache
+
+class AnswerCache:
+    """Cache of assistant answers keyed on question, language and knowledge context."""
+    
+    def __init__(self, maxsize=1000, ttl=3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._article_keys = defaultdict(set)  # article id -> cache keys using it
+        self._lock = threading.Lock()
+        self.invalidations = 0
+    
+    @staticmethod
+    def normalize_question(question):
+        """Normalize width, case, whitespace and trailing punctuation."""
+        text = unicodedata.normalize('NFKC', question).casefold()
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text.rstrip('?!.。？！ ')
+    
+    def make_key(self, question, language, knowledge_results):
+        """Build the cache key for a question and its knowledge search results."""
+        articles = sorted((result['id'], result.get('updated_at') or '') for result in knowledge_results)
+        raw = json.dumps([self.normalize_question(question), language, articles], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def get(self, question, language, knowledge_results):
+        """Get a cached answer entry, or None."""
+        return self.cache.get(self.make_key(question, language, knowledge_results))
+    
+    def set(self, question, language, knowledge_results, answer, model=None):
+        """Cache an answer."""
+        key = self.make_key(question, language, knowledge_results)
+        article_ids = [result['id'] for result in knowledge_results]
+        with self._lock:
+            for article_id in article_ids:
+                self._article_keys[article_id].add(key)
+        self.cache.set(key, {
+            'content': answer,
+            'model_used': model,
+            'article_ids': article_ids
+        })
+    
+    def _forget(self, key, entry):
+        """Drop an evicted key from the article index."""
+        with self._lock:
+            for article_id in entry['article_ids']:
+                keys = self._article_keys.get(article_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._article_keys[article_id]
+    
+    def invalidate_articles(self, changes):
+        """Drop answers built from articles that were updated, unpublished or deleted."""
+        for change in changes:
+            with self._lock:
+                keys = list(self._article_keys.get(change['id'], ()))
+            for key in keys:
+                if self.cache.delete(key):
+                    self.invalidations += 1
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        stats = self.cache.get_stats()
+        stats['invalidations'] = self.invalidations
+        return stats
+
+def init_app(app):
+    """Create the answer cache and hook it to knowledge article changes."""
+    cache = AnswerCache(
+        maxsize=app.config['ANSWER_CACHE_SIZE'],
+        ttl=app.config['ANSWER_CACHE_TTL']
+    )
+    app.extensions['answer_cache'] = cache
+    knowledge_events.subscribe(cache.invalidate_articles)
+    return cache
+
+def get_answer_cache():
+    """Get the answer cache of the current application, or None when disabled."""
+    if not current_app.config['ANSWER_CACHE_ENABLED']:
+        return None
+    return current_app.extensions['answer_cache']
@@ -0,0 +1,354 @@
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import func, select, text
+
+from src.models import db
+from src.models.system import AuditLog
+
+PARTITION_NAME = re.compile(r'^audit_logs_y(\d{4})m(\d{2})$')
+ARCHIVE_NAME = re.compile(r'^audit_logs-(\d{4})-(\d{2})(?:\.(\d+))?\.jsonl\.gz$')
+
+# Arbitrary key for the advisory lock that keeps one retention run at a time
+ADVISORY_LOCK_KEY = 0x61756474
+
+def month_start(value):
+    """Get the first day of the month of a date or datetime."""
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    """Get the first day of the month `count` months after `month`."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_bounds(month):
+    """Get the [start, end) datetimes of a month in UTC."""
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end = add_months(month, 1)
+    return start, datetime(end.year, end.month, 1, tzinfo=timezone.utc)
+
+def partition_name(month):
+    """Get the name of the audit_logs partition holding a month."""
+    return f'audit_logs_y{month.year:04d}m{month.month:02d}'
+
+def serialize_row(row):
+    """Get an audit_logs row as a JSON-safe dict."""
+    data = dict(row._mapping)
+    if data['created_at'] is not None:
+        data['created_at'] = data['created_at'].isoformat()
+    return data
+
+class PostgresPartitions:
+    """Monthly range partitions of audit_logs on PostgreSQL."""
+    
+    def is_partitioned(self, connection):
+        """Check whether audit_logs was created as a partitioned table."""
+        return connection.execute(text(
+            "SELECT count(*) FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'audit_logs'"
+        )).scalar() > 0
+    
+    def partitions(self, connection):
+        """Get the months that have a partition."""
+        names = connection.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'audit_logs'"
+        )).scalars()
+        months = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+    
+    def ensure(self, connection, months):
+        """Create partitions for the given months, plus a default partition."""
+        # The default partition catches rows outside the pre-created months
+        # (clock skew, imports), so inserts never fail for lack of a partition
+        connection.execute(text("CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT"))
+        existing = set(self.partitions(connection))
+        for month in months:
+            if month in existing:
+                continue
+            start, end = month_bounds(month)
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+    
+    def drop(self, connection, month):
+        """Detach and drop the partition of a month."""
+        name = partition_name(month)
+        connection.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+
+class AuditArchive:
+    """Monthly gzip-compressed JSONL archives of expired audit log entries."""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def _files(self, month=None):
+        pattern = f'audit_logs-{month:%Y-%m}*.jsonl.gz' if month else 'audit_logs-*.jsonl.gz'
+        files = []
+        for file_path in glob.glob(os.path.join(self.path, pattern)):
+            match = ARCHIVE_NAME.match(os.path.basename(file_path))
+            if match:
+                key = (date(int(match.group(1)), int(match.group(2)), 1), int(match.group(3) or 0))
+                files.append((key, file_path))
+        return [file_path for key, file_path in sorted(files)]
+    
+    def months(self):
+        """Get the archived months, oldest first."""
+        months = set()
+        for file_path in self._files():
+            match = ARCHIVE_NAME.match(os.path.basename(file_path))
+            months.add(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+    
+    def write(self, month, rows):
+        """Write rows of a month to a new archive file, returning the row count."""
+        os.makedirs(self.path, exist_ok=True)
+        
+        # A month archived again (e.g. after an interrupted run) gets a new part
+        parts = len(self._files(month))
+        suffix = f'.{parts}' if parts else ''
+        file_path = os.path.join(self.path, f'audit_logs-{month:%Y-%m}{suffix}.jsonl.gz')
+        
+        # Write to a temporary file and rename, so readers never see a partial archive
+        temp_path = file_path + '.tmp'
+        count = 0
+        with open(temp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in rows:
+                    archive.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        
+        if count:
+            os.replace(temp_path, file_path)
+        else:
+            os.remove(temp_path)
+        return count
+    
+    def read(self, month):
+        """Iterate over the archived entries of a month."""
+        seen = set()
+        for file_path in self._files(month):
+            with gzip.open(file_path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    entry = json.loads(line)
+                    # Parts of the same month may overlap after an interrupted run
+                    if entry['id'] in seen:
+                        continue
+                    seen.add(entry['id'])
+                    yield entry
+    
+    def search(self, start=None, end=None, user_id=None, action=None, resource_type=None, resource_id=None, limit=None):
+        """Find archived entries by time range and attributes, oldest first."""
+        results = []
+        for month in self.months():
+            month_from, month_to = month_bounds(month)
+            if (start and month_to <= start) or (end and month_from >= end):
+                continue
+            
+            for entry in self.read(month):
+                created_at = datetime.fromisoformat(entry['created_at']) if entry['created_at'] else None
+                if created_at is not None and created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                if start and (created_at is None or created_at < start):
+                    continue
+                if end and (created_at is None or created_at >= end):
+                    continue
+                if user_id and entry['user_id'] != user_id:
+                    continue
+                if action and action not in entry['action']:
+                    continue
+                if resource_type and entry['resource_type'] != resource_type:
+                    continue
+                if resource_id and entry['resource_id'] != resource_id:
+                    continue
+                
+                results.append(entry)
+                if limit and len(results) >= limit:
+                    return results
+        return results
+
+class AuditRetention:
+    """Archive audit log months past the retention period and drop them from the database."""
+    
+    def __init__(self, archive, retention_days=180, partitions_ahead=2):
+        self.archive = archive
+        self.retention_days = retention_days
+        self.partitions_ahead = partitions_ahead
+        self.partitions = None
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'archived_months': 0, 'archived_rows': 0, 'errors': 0}
+    
+    def setup(self):
+        """Create upcoming partitions when audit_logs is partitioned."""
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            return
+        
+        with engine.begin() as connection:
+            if PostgresPartitions().is_partitioned(connection):
+                self.partitions = PostgresPartitions()
+                current = month_start(datetime.now(timezone.utc))
+                self.partitions.ensure(connection, [add_months(current, i) for i in range(self.partitions_ahead + 1)])
+            else:
+                # Tables created before partitioning keep working; expired
+                # months are deleted by range instead of dropped
+                print("audit_logs is not partitioned; retention will delete expired rows")
+    
+    def cutoff(self, now=None):
+        """Get the first month that is kept; every earlier month is expired."""
+        now = now or datetime.now(timezone.utc)
+        return month_start(now - timedelta(days=self.retention_days))
+    
+    def expired_months(self, connection, now=None):
+        """Get the months with entries older than the retention period."""
+        cutoff = self.cutoff(now)
+        kept_from, _ = month_bounds(cutoff)
+        created_at = AuditLog.__table__.c.created_at
+        
+        # Walk the created_at index month by month, skipping empty months
+        months = set()
+        oldest = connection.execute(select(func.min(created_at)).where(created_at < kept_from)).scalar()
+        while oldest is not None:
+            month = month_start(oldest)
+            months.add(month)
+            _, month_end = month_bounds(month)
+            oldest = connection.execute(
+                select(func.min(created_at)).where(created_at >= month_end, created_at < kept_from)
+            ).scalar()
+        if self.partitions is not None:
+            # Empty partitions of expired months are dropped as well
+            months.update(month for month in self.partitions.partitions(connection) if month < cutoff)
+        return sorted(months)
+    
+    def archive_month(self, connection, month):
+        """Export a month to the archive, then remove it from the database."""
+        start, end = month_bounds(month)
+        table = AuditLog.__table__
+        rows = connection.execution_options(stream_results=True, yield_per=1000).execute(
+            select(table).where(table.c.created_at >= start, table.c.created_at < end).order_by(table.c.created_at)
+        )
+        count = self.archive.write(month, (serialize_row(row) for row in rows))
+        
+        # Only remove rows once the archive file is safely on disk; rows
+        # outside a monthly partition (default partition, plain table) are
+        # deleted by range
+        if self.partitions is not None and month in self.partitions.partitions(connection):
+            self.partitions.drop(connection, month)
+        connection.execute(table.delete().where(table.c.created_at >= start, table.c.created_at < end))
+        return count
+    
+    def run(self, now=None):
+        """Archive and remove every expired month, returning {month: rows archived}."""
+        engine = db.engine
+        is_postgres = engine.dialect.name == 'postgresql'
+        results = {}
+        with engine.connect() as connection:
+            if is_postgres:
+                # Several API processes may schedule the job; let one run it
+                locked = connection.execute(text(f"SELECT pg_try_advisory_lock({ADVISORY_LOCK_KEY})")).scalar()
+                connection.commit()
+                if not locked:
+                    return results
+            
+            try:
+                with connection.begin():
+                    if self.partitions is not None:
+                        current = month_start(now or datetime.now(timezone.utc))
+                        self.partitions.ensure(connection, [add_months(current, i) for i in range(self.partitions_ahead + 1)])
+                    months = self.expired_months(connection, now)
+                
+                # One transaction per month, so a failure keeps earlier months archived
+                for month in months:
+                    try:
+                        with connection.begin():
+                            count = self.archive_month(connection, month)
+                    except Exception as e:
+                        self._incr('errors')
+                        print(f"Audit log archival error for {month:%Y-%m}: {e}")
+                        break
+                    results[month.strftime('%Y-%m')] = count
+                    self._incr('archived_months')
+                    self._incr('archived_rows', count)
+            finally:
+                if is_postgres:
+                    connection.execute(text(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_KEY})"))
+                    connection.commit()
+        
+        self._incr('runs')
+        self.last_run = datetime.now(timezone.utc)
+        return results
+    
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def get_stats(self):
+        """Get retention statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['retention_days'] = self.retention_days
+        stats['partitioned'] = self.partitions is not None
+        stats['archived'] = [month.strftime('%Y-%m') for month in self.archive.months()]
+        stats['last_run'] = self.last_run.isoformat() if self.last_run else None
+        return stats
+
+def _run_periodically(app, retention, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                retention.run()
+            except Exception as e:
+                print(f"Audit log retention error: {e}")
+
+def init_app(app):
+    """Set up audit log partitions, the retention job and its CLI command."""
+    path = app.config['AUDIT_ARCHIVE_PATH']
+    if not path or app.config['AUDIT_LOG_RETENTION_DAYS'] <= 0:
+        return None
+    
+    retention = AuditRetention(
+        AuditArchive(path),
+        retention_days=app.config['AUDIT_LOG_RETENTION_DAYS'],
+        partitions_ahead=app.config['AUDIT_PARTITIONS_AHEAD']
+    )
+    with app.app_context():
+        retention.setup()
+    
+    @app.cli.command('archive-audit-logs')
+    def archive_audit_logs():
+        """Archive audit log months past the retention period."""
+        for month, count in retention.run().items():
+            print(f"Archived {count} audit log entries from {month}")
+    
+    if app.config['AUDIT_RETENTION_INTERVAL'] > 0:
+        threading.Thread(
+            target=_run_periodically,
+            args=(app, retention, app.config['AUDIT_RETENTION_INTERVAL']),
+            name='audit-retention',
+            daemon=True
+        ).start()
+    
+    app.extensions['audit_retention'] = retention
+    return retention
+
+def get_audit_retention():
+    """Get the audit log retention job of the current application, or None when disabled."""
+    return current_app.extensions.get('audit_retention')
@@ -0,0 +1,162 @@
+import atexit
+import queue
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models import db
+from src.models.system import AuditLog
+
+_registered = False
+
+class AuditWriter:
+    """Buffer audit log entries and write them in batches from a background thread."""
+    
+    def __init__(self, engine, maxsize=10000, batch_size=100, flush_interval=1.0, block_timeout=0.05):
+        self.engine = engine
+        self.table = AuditLog.__table__
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'written': 0, 'batches': 0, 'sync_writes': 0, 'errors': 0}
+    
+    def submit(self, entry):
+        """Queue an entry, writing it synchronously when the queue stays full."""
+        if not self._stop.is_set():
+            try:
+                # Block briefly so bursts slow request handlers down instead of dropping entries
+                self._queue.put(entry, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        self._incr('sync_writes')
+        self._write([entry])
+    
+    def start(self):
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=5.0):
+        """Stop the writer thread and write whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+    
+    def flush(self):
+        """Write all queued entries now."""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+    
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            
+            # Give the batch until the flush interval to fill up
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            batch.extend(self._drain(self.batch_size - len(batch)))
+            self._write(batch)
+    
+    def _write(self, batch):
+        try:
+            # One multi-row INSERT and one commit for the whole batch
+            with self.engine.begin() as connection:
+                connection.execute(self.table.insert(), batch)
+            self._incr('written', len(batch))
+            self._incr('batches')
+        except Exception as e:
+            print(f"Audit log batch write error: {e}")
+            if len(batch) > 1:
+                # Retry row by row so one bad entry does not lose the batch
+                for entry in batch:
+                    self._write([entry])
+            else:
+                self._incr('errors')
+    
+    def get_stats(self):
+        """Get writer statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['batch_size'] = self.batch_size
+        stats['flush_interval'] = self.flush_interval
+        stats['alive'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+def _after_commit(session):
+    # Entries logged with commit=False belong to the committed transaction
+    entries = session.info.pop('audit_entries', None)
+    if not entries or not has_app_context():
+        return
+    
+    writer = current_app.extensions.get('audit_writer')
+    if writer is not None:
+        for entry in entries:
+            writer.submit(entry)
+
+def _after_rollback(session):
+    session.info.pop('audit_entries', None)
+
+def init_app(app):
+    """Create and start the audit log writer."""
+    global _registered
+    if not app.config['AUDIT_LOG_ASYNC']:
+        return None
+    
+    if not _registered:
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+        _registered = True
+    
+    with app.app_context():
+        engine = db.engine
+    writer = AuditWriter(
+        engine,
+        maxsize=app.config['AUDIT_LOG_QUEUE_SIZE'],
+        batch_size=app.config['AUDIT_LOG_BATCH_SIZE'],
+        flush_interval=app.config['AUDIT_LOG_FLUSH_INTERVAL']
+    )
+    writer.start()
+    atexit.register(writer.stop)
+    
+    app.extensions['audit_writer'] = writer
+    return writer
+
+def get_audit_writer():
+    """Get the audit log writer of the current application, or None when disabled."""
+    return current_app.extensions.get('audit_writer')
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry."""
+    
+    def __init__(self, maxsize=1024, ttl=300, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict  # Called with (key, value) when an entry is dropped
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+    
+    def _drop(self, key):
+        _, value = self._data.pop(key)
+        if self.on_evict:
+            self.on_evict(key, value)
+    
+    def get(self, key, default=None, count=True):
+        """Get a value, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+    
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+    
+    def delete(self, key):
+        """Remove a value if present."""
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+                return True
+            return False
+    
+    def clear(self):
+        """Remove all values."""
+        with self._lock:
+            self._data.clear()
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
@@ -0,0 +1,221 @@
+import requests
+from flask import current_app
+
+from src.models.system import SystemSetting
+from src.services.answer_cache import get_answer_cache
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.conversation_memory import load_history, schedule_summary
+from src.services.llm_client import get_llm_client
+from src.services.model_router import get_model_router
+from src.services.prompt_builder import PromptBuilder, truncate_to_tokens
+from src.services.retrieval import retrieve_passages
+from src.services.tokenizers import get_token_counter
+
+# The query is repeated in the system prompt; a preview is enough there
+QUERY_PREVIEW_TOKENS = 100
+
+# Answers given while the LLM service is unavailable: (with articles, without articles)
+FALLBACK_MESSAGES = {
+    'ja': (
+        'AIアシスタントは現在ご利用いただけません。次のナレッジベース記事がお役に立つかもしれません：',
+        'AIアシスタントは現在ご利用いただけません。サポートチケットを作成していただければ、担当者が対応いたします。'
+    ),
+    'zh': (
+        'AI 助手暂时不可用。以下知识库文章可能对您有帮助：',
+        'AI 助手暂时不可用。请创建支持工单，工作人员会尽快为您处理。'
+    ),
+    'en': (
+        'The AI assistant is temporarily unavailable. These knowledge base articles may help:',
+        'The AI assistant is temporarily unavailable. Please create a support ticket and our staff will help you.'
+    )
+}
+FALLBACK_ARTICLES = 3
+
+def search_knowledge_base(query, language='ja'):
+    """Search knowledge base for the passages most relevant to a query."""
+    try:
+        return retrieve_passages(query, language)
+    except Exception as e:
+        print(f"Knowledge search error: {e}")
+        return []
+
+def record_usage(usage, result):
+    """Copy Ollama's token counts from a final response into a usage dict."""
+    if usage is not None:
+        usage['prompt_tokens'] = result.get('prompt_eval_count')
+        usage['completion_tokens'] = result.get('eval_count')
+
+def call_ollama_api(messages, model=None, usage=None):
+    """Call Ollama API for LLM response; token counts are stored in usage when given.
+    
+    Raises a requests RequestException when the LLM service cannot answer,
+    CircuitOpenError while it is considered down.
+    """
+    ollama_url = SystemSetting.get_setting('ollama_base_url', 'http://localhost:11434')
+    model = model or SystemSetting.get_setting('default_llm_model', 'llama2')
+    
+    # Format messages for Ollama
+    formatted_messages = []
+    for msg in messages:
+        formatted_messages.append({
+            'role': msg['role'],
+            'content': msg['content']
+        })
+    
+    response = get_llm_client().chat(model, formatted_messages, base_url=ollama_url)
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(
+            f"LLM service returned status {response.status_code}",
+            response=response
+        )
+    
+    result = response.json()
+    record_usage(usage, result)
+    return result.get('message', {}).get('content', 'Sorry, I could not generate a response.')
+
+def stream_ollama_api(messages, model=None, usage=None):
+    """Call Ollama API and yield response content chunks as they arrive; token counts are stored in usage when given."""
+    ollama_url = SystemSetting.get_setting('ollama_base_url', 'http://localhost:11434')
+    model = model or SystemSetting.get_setting('default_llm_model', 'llama2')
+    
+    formatted_messages = [{'role': msg['role'], 'content': msg['content']} for msg in messages]
+    
+    for chunk in get_llm_client().stream_chat(model, formatted_messages, base_url=ollama_url):
+        if chunk.get('done'):
+            record_usage(usage, chunk)
+        content = chunk.get('message', {}).get('content', '')
+        if content:
+            yield content
+
+def build_llm_messages(conversation, content, knowledge_results, language, saved=True):
+    """Build the message list sent to the LLM for a user message (saved: already stored in history).
+    
+    Returns (llm_messages, prompt_info), the prompt trimmed to LLM_PROMPT_TOKEN_BUDGET
+    and its token accounting per segment.
+    """
+    budget = current_app.config['LLM_PROMPT_TOKEN_BUDGET']
+    count_tokens = get_token_counter()
+    prompt = PromptBuilder(budget, count_tokens=count_tokens)
+    
+    # Prepare context for AI
+    prompt.system('instructions', f"""You are BEwithU, an intelligent IT support assistant. You help users with IT-related questions and problems.
+
+Current user language: {language}
+Please respond in the user's language.
+
+If you find relevant information in the knowledge base, use it to provide accurate answers.
+If you cannot find relevant information, politely explain that you need to create a support ticket for human assistance.
+
+Knowledge base search results for "{truncate_to_tokens(content, QUERY_PREVIEW_TOKENS, count_tokens)}":
+""", required=True)
+    
+    if knowledge_results:
+        # Lower-ranked articles are dropped first when the prompt is over budget
+        for rank, result in enumerate(knowledge_results):
+            text = "\nRelevant articles found:\n" if rank == 0 else ""
+            text += f"- {result['title']}: {result['summary']}\n"
+            for passage in result['passages']:
+                text += f"  Excerpt: {passage}\n"
+            text += "\n"
+            prompt.system('knowledge', text, value=40 - rank)
+    else:
+        prompt.system('instructions', "\nNo relevant articles found in the knowledge base.\n", required=True)
+    
+    prompt.system('instructions', """
+Based on the above information, please provide a helpful response. If you can answer the question using the knowledge base, do so. If not, suggest creating a support ticket for human assistance.
+""", required=True)
+    
+    # Get conversation history for context: a running summary of older
+    # turns plus the recent messages that fit the history token budget
+    summary, recent_messages, overflowed = load_history(conversation, saved=saved)
+    if summary:
+        prompt.system('summary', f"\nSummary of the earlier conversation:\n{summary}\n", value=30)
+    if overflowed:
+        schedule_summary(conversation.id)
+    
+    # Add recent conversation history, oldest dropped first; the newest
+    # message is always kept so follow-ups are never mistaken for openers
+    for index, msg in enumerate(recent_messages):
+        newest = index == len(recent_messages) - 1
+        prompt.message(
+            'history', msg.role, msg.content, value=10 + index,
+            required=newest, max_tokens=budget // 4 if newest else None
+        )
+    
+    # Add current user message
+    prompt.message('user', 'user', content, required=True, max_tokens=budget // 2)
+    
+    return prompt.build()
+
+def is_opening_question(conversation, saved=True):
+    """Tell whether a user message opens its conversation (saved: already stored in it).
+    
+    Decided from the conversation rather than the prompt, which may have
+    lost its history to the token budget or carry it as a summary.
+    """
+    earlier = (conversation.message_count or 0) - (1 if saved else 0)
+    return earlier <= 0 and not conversation.summary
+
+def get_cached_response(opening, content, language, knowledge_results):
+    """Get a cached answer for an opening question, or None."""
+    cache = get_answer_cache()
+    # Follow-up turns depend on conversation history, so only opening
+    # questions are served from the cache
+    if cache is None or not opening:
+        return None
+    return cache.get(content, language, knowledge_results)
+
+def cache_response(opening, content, language, knowledge_results, ai_response, model):
+    """Cache an answer to an opening question."""
+    cache = get_answer_cache()
+    if cache is None or not opening or ai_response.startswith('Error:'):
+        return
+    cache.set(content, language, knowledge_results, ai_response, model=model)
+
+def build_fallback_response(knowledge_results, language):
+    """Answer without the LLM: the top knowledge base articles, or a ticket suggestion."""
+    with_articles, without_articles = FALLBACK_MESSAGES.get((language or '').split('-')[0].lower(), FALLBACK_MESSAGES['en'])
+    if not knowledge_results:
+        return without_articles
+    
+    lines = [with_articles]
+    for result in knowledge_results[:FALLBACK_ARTICLES]:
+        lines.append(f"- {result['title']}: {result['summary']}" if result.get('summary') else f"- {result['title']}")
+    return '\n'.join(lines)
+
+def llm_unavailable():
+    """Tell whether the LLM service circuit is open, so calls would fail at once."""
+    return get_llm_client().breaker.is_open()
+
+def generate_response(llm_messages, content, language, knowledge_results, opening=False, request_class='chat'):
+    """Get the assistant response and generation info, using the answer cache for opening questions.
+    
+    While the LLM service is down or fails the response is built from the
+    knowledge base results instead. Raises ModelBusy when the routed model has no free slot
+    for an interactive request.
+    """
+    cached = get_cached_response(opening, content, language, knowledge_results)
+    if cached is not None:
+        return cached['content'], {'model_used': cached['model_used'], 'cache_hit': True, 'fallback': False, 'prompt_tokens': None, 'completion_tokens': None}
+    
+    fallback = (
+        build_fallback_response(knowledge_results, language),
+        {'model_used': None, 'cache_hit': False, 'fallback': True, 'prompt_tokens': None, 'completion_tokens': None}
+    )
+    # Fail fast without waiting for a model slot
+    if llm_unavailable():
+        return fallback
+    
+    router = get_model_router()
+    model = router.select(language, request_class)
+    usage = {'prompt_tokens': None, 'completion_tokens': None}
+    with router.acquire(model, request_class):
+        try:
+            ai_response = call_ollama_api(llm_messages, model=model, usage=usage)
+        except requests.exceptions.RequestException as e:
+            # Includes CircuitOpenError; the error text is not for users
+            if not isinstance(e, CircuitOpenError):
+                print(f"LLM generation error: {e}")
+            return fallback
+    cache_response(opening, content, language, knowledge_results, ai_response, model)
+    return ai_response, dict(usage, model_used=model, cache_hit=False, fallback=False)
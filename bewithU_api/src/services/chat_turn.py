@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+from src.models import db
+from src.models.chat import ChatMessage
+from src.models.system import AuditLog
+
+class ChatTurn:
+    """Unit of work for one chat exchange, persisted with a single commit.
+    
+    Messages are built in memory while the reply is generated, so no write
+    transaction stays open during the LLM call; commit() then stores the
+    messages, the conversation summary and title, the audit entry and any
+    related objects together.
+    """
+    
+    def __init__(self, conversation):
+        self.conversation = conversation
+        self.messages = []
+        self.objects = []
+        self.audit = None
+        self.received_at = datetime.now(timezone.utc)
+    
+    def add_message(self, role, content, metadata=None):
+        """Add a message; the user message keeps the time the request arrived."""
+        created_at = self.received_at if role == 'user' else datetime.now(timezone.utc)
+        message = ChatMessage.build(self.conversation.id, role, content, metadata, created_at=created_at)
+        self.messages.append(message)
+        return message
+    
+    def add(self, obj):
+        """Add another object to persist with the turn, e.g. a chat job."""
+        self.objects.append(obj)
+        return obj
+    
+    def log(self, user_id, user_message, assistant_message, ip_address=None, user_agent=None):
+        """Record the chat_message audit entry for the exchange."""
+        self.audit = {
+            'user_id': user_id,
+            'action': 'chat_message',
+            'resource_type': 'chat_message',
+            'resource_id': user_message.id,
+            'new_values': {
+                'user_message': user_message.to_dict(),
+                'assistant_message': assistant_message.to_dict()
+            },
+            'ip_address': ip_address,
+            'user_agent': user_agent
+        }
+    
+    def commit(self):
+        """Persist everything in one transaction."""
+        db.session.add_all(self.messages)
+        db.session.add_all(self.objects)
+        if self.messages:
+            self.conversation.record_messages(self.messages)
+        if self.audit is not None:
+            AuditLog.log_action(commit=False, **self.audit)
+        db.session.commit()
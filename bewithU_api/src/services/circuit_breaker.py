@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a service whose circuit is open."""
+
+class CircuitBreaker:
+    """Stop calling a failing or slow service for a while, then probe it with one request.
+    
+    After failure_threshold consecutive failures (errors, 5xx responses or
+    calls slower than slow_call_seconds) the circuit opens and calls fail
+    fast. After reset_timeout one probe is let through: success closes the
+    circuit, failure opens it again.
+    """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, slow_call_seconds=None, window=200):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'rejected': 0,
+            'opened': 0
+        }
+    
+    def before_call(self):
+        """Check that a call may be made, raising CircuitOpenError otherwise.
+        
+        Returns True when the call is the half-open probe.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats['rejected'] += 1
+        raise CircuitOpenError('LLM service is unavailable (circuit open)')
+    
+    def is_open(self):
+        """Tell whether calls would currently be rejected without trying one."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self._probing
+    
+    def record(self, seconds, failed, probe=False):
+        """Record the outcome of a call let through by before_call()."""
+        slow = self.slow_call_seconds is not None and seconds > self.slow_call_seconds
+        with self._lock:
+            self._stats['calls'] += 1
+            self._latencies.append(seconds)
+            if slow:
+                self._stats['slow_calls'] += 1
+            if failed:
+                self._stats['failures'] += 1
+            
+            if probe:
+                self._probing = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self._failures = 0
+                    self.state = CLOSED
+            elif self.state == CLOSED:
+                # Calls started before the circuit opened do not change its state
+                if failed or slow:
+                    self._failures += 1
+                    if self._failures >= self.failure_threshold:
+                        self._open()
+                else:
+                    self._failures = 0
+    
+    def _open(self):
+        # Called with the lock held
+        if self.state != OPEN:
+            self._stats['opened'] += 1
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+    
+    def get_stats(self):
+        """Get breaker statistics with latency percentiles of recent calls."""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+            stats['state'] = self.state
+            stats['consecutive_failures'] = self._failures
+            stats['open_for'] = round(max(self.reset_timeout - (time.monotonic() - self._opened_at), 0), 2) if self.state == OPEN else None
+        
+        for name, percentile in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]:
+            stats[f'latency_{name}_ms'] = round(latencies[min(int(len(latencies) * percentile), len(latencies) - 1)] * 1000, 2) if latencies else None
+        stats['failure_threshold'] = self.failure_threshold
+        stats['reset_timeout'] = self.reset_timeout
+        stats['slow_call_seconds'] = self.slow_call_seconds
+        return stats
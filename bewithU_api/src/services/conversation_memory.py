@@ -0,0 +1,155 @@
+import queue
+import threading
+
+from flask import current_app
+
+from src.models import db
+from src.models.chat import ChatConversation, ChatMessage
+from src.models.system import SystemSetting
+from src.models.user import User
+from src.services.llm_client import get_llm_client
+from src.services.model_router import get_model_router
+from src.services.tokenizers import get_token_counter
+
+# Messages and characters of one transcript line fed to the summarizer
+SUMMARY_BATCH_MESSAGES = 200
+SUMMARY_MESSAGE_CHARS = 2000
+
+SUMMARY_PROMPT = """You maintain the memory of an IT support conversation.
+Merge the existing summary and the new messages into one updated summary.
+Keep the user's problem, environment details, steps already tried, answers given and open questions.
+Write it in the language of the conversation, in at most {words} words, without any preamble."""
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+def load_history(conversation, saved=True):
+    """Get (summary, history messages oldest first, overflowed) for a prompt.
+    
+    The history holds the newest messages after the stored summary that fit
+    the CHAT_HISTORY_TOKEN_BUDGET; overflowed tells whether older ones had
+    to be left out, i.e. whether the summary should be extended.
+    """
+    max_messages = current_app.config['CHAT_HISTORY_MAX_MESSAGES']
+    budget = current_app.config['CHAT_HISTORY_TOKEN_BUDGET']
+    
+    query = ChatMessage.query.filter_by(conversation_id=conversation.id)
+    if conversation.summarized_until is not None:
+        query = query.filter(ChatMessage.created_at > conversation.summarized_until)
+    # One extra row tells whether anything older was left out
+    skip = 1 if saved else 0
+    recent = query.order_by(ChatMessage.created_at.desc()).limit(max_messages + skip + 1).all()[skip:]
+    
+    count_tokens = get_token_counter()
+    history = []
+    used = 0
+    for message in recent[:max_messages]:
+        cost = count_tokens(message.content)
+        if history and used + cost > budget:
+            break
+        history.append(message)
+        used += cost
+    history.reverse()
+    return conversation.summary, history, len(history) < len(recent)
+
+def schedule_summary(conversation_id):
+    """Queue a background job extending the summary of a conversation."""
+    if not current_app.config['CHAT_SUMMARY_ENABLED']:
+        return False
+    with _pending_lock:
+        if conversation_id in _pending:
+            return False
+        _pending.add(conversation_id)
+    
+    from src.services.llm_jobs import get_worker_pool
+    try:
+        get_worker_pool().submit('summary', conversation_id)
+    except queue.Full:
+        # The next turn tries again
+        with _pending_lock:
+            _pending.discard(conversation_id)
+        return False
+    return True
+
+def summarize(previous_summary, messages, language=None):
+    """Ask the LLM for a summary covering the previous summary and (role, content) messages."""
+    max_tokens = current_app.config['CHAT_SUMMARY_MAX_TOKENS']
+    transcript = '\n'.join(f"{role}: {content[:SUMMARY_MESSAGE_CHARS]}" for role, content in messages)
+    content = f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    
+    ollama_url = SystemSetting.get_setting('ollama_base_url', 'http://localhost:11434')
+    router = get_model_router()
+    model = router.select(language, 'summary')
+    with router.acquire(model, 'summary'):
+        response = get_llm_client().chat(
+            model,
+            [
+                {'role': 'system', 'content': SUMMARY_PROMPT.format(words=max_tokens * 3 // 4)},
+                {'role': 'user', 'content': content}
+            ],
+            base_url=ollama_url,
+            options={'num_predict': max_tokens}
+        )
+    if response.status_code != 200:
+        raise RuntimeError(f"LLM service returned status {response.status_code}")
+    summary = response.json().get('message', {}).get('content', '').strip()
+    if not summary:
+        raise RuntimeError("LLM service returned an empty summary")
+    return summary
+
+def process_summary_job(conversation_id):
+    """Compact the older unsummarized messages of a conversation into its summary."""
+    try:
+        conversation = db.session.get(ChatConversation, conversation_id)
+        if conversation is None:
+            return
+        
+        max_messages = current_app.config['CHAT_HISTORY_MAX_MESSAGES']
+        budget = current_app.config['CHAT_HISTORY_TOKEN_BUDGET']
+        summarized_until = conversation.summarized_until
+        
+        query = ChatMessage.query.filter_by(conversation_id=conversation_id)
+        if summarized_until is not None:
+            query = query.filter(ChatMessage.created_at > summarized_until)
+        messages = query.order_by(ChatMessage.created_at).limit(SUMMARY_BATCH_MESSAGES).all()
+        
+        # Keep the newest messages within half the budget verbatim, so the
+        # next few turns fit without triggering another summary. A full batch
+        # is followed by newer messages, so all of it is summarized.
+        keep = 0
+        if len(messages) < SUMMARY_BATCH_MESSAGES:
+            count_tokens = get_token_counter()
+            used = 0
+            for message in reversed(messages):
+                cost = count_tokens(message.content)
+                if keep >= max_messages // 2 or used + cost > budget // 2:
+                    break
+                keep += 1
+                used += cost
+        older = [(message.role, message.content) for message in messages[:len(messages) - keep]]
+        if not older:
+            return
+        previous_summary = conversation.summary
+        until = messages[len(older) - 1].created_at
+        user = db.session.get(User, conversation.user_id)
+        language = user.language if user else None
+        
+        # End the read transaction rather than hold it through the LLM call
+        db.session.rollback()
+        summary = summarize(previous_summary, older, language=language)
+        
+        # Only store the summary if no other job extended it meanwhile;
+        # updated_at is kept so the conversation list order does not change
+        table = ChatConversation.__table__
+        condition = table.c.summarized_until.is_(None) if summarized_until is None else table.c.summarized_until == summarized_until
+        db.session.execute(
+            table.update().where(table.c.id == conversation_id, condition).values(
+                summary=summary,
+                summarized_until=until,
+                updated_at=table.c.updated_at
+            )
+        )
+        db.session.commit()
+    finally:
+        with _pending_lock:
+            _pending.discard(conversation_id)
@@ -0,0 +1,87 @@
+from sqlalchemy import and_, func, inspect, text
+
+from src.models import db
+from src.models.chat import ChatConversation, ChatMessage
+
+SUMMARY_COLUMNS = {
+    'message_count': 'INTEGER NOT NULL DEFAULT 0',
+    'last_message_at': 'TIMESTAMP WITH TIME ZONE',
+    'last_message_preview': 'TEXT',
+    'summary': 'TEXT',
+    'summarized_until': 'TIMESTAMP WITH TIME ZONE'
+}
+
+def add_missing_columns(connection):
+    """Add the summary columns to a chat_conversations table created before them."""
+    existing = {column['name'] for column in inspect(connection).get_columns('chat_conversations')}
+    added = []
+    for name, definition in SUMMARY_COLUMNS.items():
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE chat_conversations ADD COLUMN {name} {definition}"))
+            added.append(name)
+    
+    for index in ChatConversation.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    return added
+
+def backfill(batch_size=500):
+    """Recompute the message summary of every conversation, returning the number updated."""
+    updated = 0
+    last_id = ''
+    while True:
+        ids = [row.id for row in db.session.query(ChatConversation.id).filter(
+            ChatConversation.id > last_id
+        ).order_by(ChatConversation.id).limit(batch_size)]
+        if not ids:
+            return updated
+        last_id = ids[-1]
+        
+        stats = db.session.query(
+            ChatMessage.conversation_id,
+            func.count(ChatMessage.id).label('message_count'),
+            func.max(ChatMessage.created_at).label('last_message_at')
+        ).filter(ChatMessage.conversation_id.in_(ids)).group_by(ChatMessage.conversation_id).subquery()
+        
+        last_messages = db.session.query(ChatMessage, stats.c.message_count).join(
+            stats,
+            and_(ChatMessage.conversation_id == stats.c.conversation_id, ChatMessage.created_at == stats.c.last_message_at)
+        )
+        summaries = {}
+        for message, message_count in last_messages:
+            summaries.setdefault(message.conversation_id, {
+                'conversation_id': message.conversation_id,
+                'message_count': message_count,
+                'last_message_at': message.created_at,
+                'last_message_preview': message.get_preview()
+            })
+        for conversation_id in ids:
+            summaries.setdefault(conversation_id, {
+                'conversation_id': conversation_id,
+                'message_count': 0,
+                'last_message_at': None,
+                'last_message_preview': None
+            })
+        
+        # Bulk UPDATE by primary key; updated_at is kept as is (instead of its
+        # onupdate default) so the conversation list order does not change
+        table = ChatConversation.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('conversation_id')).values(updated_at=table.c.updated_at),
+            list(summaries.values())
+        )
+        db.session.commit()
+        updated += len(ids)
+
+def init_app(app):
+    """Add summary columns to older databases and register the backfill command."""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            added = add_missing_columns(connection)
+        if added:
+            print(f"Added conversation summary columns: {', '.join(added)}; backfilling")
+            backfill()
+    
+    @app.cli.command('backfill-conversation-summaries')
+    def backfill_conversation_summaries():
+        """Recompute message counts and last messages of all conversations."""
+        print(f"Backfilled {backfill()} conversations")
@@ -0,0 +1,159 @@
+import re
+
+from flask import current_app
+from sqlalchemy import cast, column, func, literal_column, table, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from src.models import db
+from src.models.knowledge import KnowledgeArticle
+
+def split_terms(query):
+    """Split a search query into terms."""
+    return [term for term in re.split(r'\s+', query.replace('"', ' ')) if term]
+
+class SQLiteFullText:
+    """FTS5 shadow table maintained by triggers on knowledge_articles."""
+    
+    name = 'sqlite_fts5'
+    table_name = 'knowledge_articles_fts'
+    
+    # The trigram tokenizer keeps substring semantics for languages without
+    # word separators (ja, zh), but needs at least three characters per term
+    min_term_length = 3
+    
+    def setup(self, connection):
+        """Create the FTS5 table and triggers, backfilling existing articles."""
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table_name} "
+            f"USING fts5(article_id UNINDEXED, title, summary, content, tokenize='trigram')"
+        ))
+        
+        insert_new = (
+            f"INSERT INTO {self.table_name} (article_id, title, summary, content) "
+            f"VALUES (new.id, new.title, coalesce(new.summary, ''), new.content);"
+        )
+        delete_old = f"DELETE FROM {self.table_name} WHERE article_id = old.id;"
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table_name}_ai AFTER INSERT ON knowledge_articles "
+            f"BEGIN {insert_new} END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table_name}_au AFTER UPDATE OF title, summary, content "
+            f"ON knowledge_articles BEGIN {delete_old} {insert_new} END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table_name}_ad AFTER DELETE ON knowledge_articles "
+            f"BEGIN {delete_old} END"
+        ))
+        
+        indexed = connection.execute(text(f"SELECT count(*) FROM {self.table_name}")).scalar()
+        total = connection.execute(text("SELECT count(*) FROM knowledge_articles")).scalar()
+        if indexed != total:
+            self.rebuild(connection)
+    
+    def rebuild(self, connection):
+        """Rebuild the FTS5 table from knowledge_articles."""
+        connection.execute(text(f"DELETE FROM {self.table_name}"))
+        connection.execute(text(
+            f"INSERT INTO {self.table_name} (article_id, title, summary, content) "
+            f"SELECT id, title, coalesce(summary, ''), content FROM knowledge_articles"
+        ))
+    
+    def match_expression(self, query):
+        """Build an FTS5 query matching any term, or None if no term is usable."""
+        terms = [term for term in split_terms(query) if len(term) >= self.min_term_length]
+        if not terms:
+            return None
+        return ' OR '.join(f'"{term}"' for term in terms)
+    
+    def apply(self, articles, query):
+        """Restrict an article query to matches, ordered by relevance."""
+        expression = self.match_expression(query)
+        if expression is None:
+            return None
+        
+        fts = table(self.table_name, column('article_id'))
+        # Column weights: title, summary, content (bm25 is lower-is-better)
+        rank = literal_column(f'bm25({self.table_name}, 0.0, 10.0, 5.0, 1.0)')
+        return articles.join(fts, fts.c.article_id == KnowledgeArticle.id).filter(
+            literal_column(self.table_name).op('MATCH')(expression)
+        ).order_by(rank, KnowledgeArticle.updated_at.desc())
+    
+    def get_stats(self):
+        """Get backend statistics."""
+        return {'backend': self.name}
+
+class PostgresFullText:
+    """Generated tsvector column with a GIN index on knowledge_articles."""
+    
+    name = 'postgres_tsvector'
+    
+    def __init__(self, ts_config='simple'):
+        self.ts_config = ts_config
+    
+    def setup(self, connection):
+        """Add the generated search_vector column and its GIN index."""
+        ts_config = self.ts_config.replace("'", "''")
+        connection.execute(text(
+            "ALTER TABLE knowledge_articles ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{ts_config}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{ts_config}', coalesce(summary, '')), 'B') || "
+            f"setweight(to_tsvector('{ts_config}', coalesce(content, '')), 'C')"
+            ") STORED"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_knowledge_articles_search_vector "
+            "ON knowledge_articles USING GIN (search_vector)"
+        ))
+    
+    def apply(self, articles, query):
+        """Restrict an article query to matches, ordered by relevance."""
+        terms = split_terms(query)
+        if not terms:
+            return None
+        
+        # The column is generated by the database and is not mapped on the model
+        vector = literal_column('knowledge_articles.search_vector')
+        tsquery = func.websearch_to_tsquery(cast(self.ts_config, REGCONFIG), ' or '.join(terms))
+        return articles.filter(vector.op('@@')(tsquery)).order_by(
+            func.ts_rank_cd(vector, tsquery).desc(),
+            KnowledgeArticle.updated_at.desc()
+        )
+    
+    def get_stats(self):
+        """Get backend statistics."""
+        return {'backend': self.name, 'ts_config': self.ts_config}
+
+def create_backend(app, dialect):
+    """Create the full-text backend for the configured engine and database."""
+    backend = app.config['FULLTEXT_BACKEND']
+    if backend == 'auto':
+        backend = dialect
+    
+    if backend in ('postgres', 'postgresql'):
+        return PostgresFullText(app.config['FULLTEXT_PG_CONFIG'])
+    if backend == 'sqlite':
+        return SQLiteFullText()
+    return None
+
+def init_app(app):
+    """Set up the full-text backend; search falls back to LIKE without one."""
+    with app.app_context():
+        backend = create_backend(app, db.engine.dialect.name)
+        if backend is None:
+            return None
+        
+        try:
+            with db.engine.begin() as connection:
+                backend.setup(connection)
+        except Exception as e:
+            print(f"Full-text search setup error ({backend.name}): {e}")
+            return None
+    
+    app.extensions['fulltext'] = backend
+    return backend
+
+def get_fulltext_backend():
+    """Get the full-text backend of the current application, or None."""
+    return current_app.extensions.get('fulltext')
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from src.models.knowledge import KnowledgeArticle
+
+# Columns whose changes affect search results and generated answers
+TRACKED_FIELDS = ['title', 'content', 'summary', 'status', 'language', 'category_id']
+
+_subscribers = []
+_registered = False
+
+def subscribe(callback):
+    """Call callback(changes) after a commit that changed knowledge articles."""
+    _subscribers.append(callback)
+
+def snapshot(article, change):
+    """Capture article state at flush time for post-commit subscribers."""
+    return {
+        'id': article.id,
+        'change': change,  # 'insert', 'update' or 'delete'
+        'title': article.title,
+        'summary': article.summary,
+        'content': article.content,
+        'status': article.status,
+        'language': article.language,
+        'category_id': article.category_id,
+        'updated_at': article.updated_at.isoformat() if article.updated_at else None
+    }
+
+def change_time(value):
+    """Get an updated_at value (datetime or snapshot string) as an aware UTC datetime.
+    
+    SQLite returns naive datetimes; every timestamp the app writes is UTC.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _record(article, change):
+    session = object_session(article)
+    if session is not None:
+        session.info.setdefault('knowledge_changes', []).append(snapshot(article, change))
+
+def _after_insert(mapper, connection, article):
+    _record(article, 'insert')
+
+def _after_update(mapper, connection, article):
+    state = inspect(article)
+    if any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+        _record(article, 'update')
+
+def _after_delete(mapper, connection, article):
+    _record(article, 'delete')
+
+def _after_commit(session):
+    changes = session.info.pop('knowledge_changes', None)
+    if not changes:
+        return
+    
+    for callback in list(_subscribers):
+        try:
+            callback(changes)
+        except Exception as e:
+            print(f"Knowledge change subscriber error: {e}")
+
+def _after_rollback(session):
+    session.info.pop('knowledge_changes', None)
+
+def init_app(app):
+    """Register SQLAlchemy listeners that track knowledge article changes."""
+    global _registered
+    if _registered:
+        return
+    
+    event.listen(KnowledgeArticle, 'after_insert', _after_insert)
+    event.listen(KnowledgeArticle, 'after_update', _after_update)
+    event.listen(KnowledgeArticle, 'after_delete', _after_delete)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+    _registered = True
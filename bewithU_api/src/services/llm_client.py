@@ -0,0 +1,269 @@
+import json
+import random
+import threading
+import time
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import EmptyPoolError
+
+from src.services.circuit_breaker import CircuitBreaker
+
+class PoolTimeout(requests.exceptions.Timeout):
+    """Raised when no pooled connection became free within the pool timeout."""
+
+def _bounded_pool_class(pool_class, pool_timeout):
+    class BoundedPool(pool_class):
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(timeout=pool_timeout if timeout is None else timeout)
+    return BoundedPool
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose callers wait at most pool_timeout seconds for a pooled connection.
+    
+    requests never passes a pool timeout to urllib3, so with pool_block=True
+    a caller would otherwise wait forever once every connection is in use.
+    """
+    
+    def __init__(self, pool_timeout, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _bounded_pool_class(pool_class, self.pool_timeout)
+            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+        }
+    
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise PoolTimeout(e, request=request)
+
+class LLMClient:
+    """Pooled, keep-alive HTTP client for the Ollama API."""
+    
+    def __init__(self, base_url, pool_size=10, pool_timeout=10.0, connect_timeout=3.05, read_timeout=30,
+                 max_retries=2, retry_backoff=0.5, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        
+        # A single bounded pool per host; callers wait up to pool_timeout for a
+        # free connection instead of opening new sockets once it is exhausted.
+        self.adapter = BoundedPoolAdapter(
+            pool_timeout,
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'retries': 0,
+            'pool_timeouts': 0,
+            'in_flight': 0,
+            'total_latency_ms': 0.0
+        }
+    
+    def __repr__(self):
+        return f'<LLMClient {self.base_url}>'
+    
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def _sleep_before_retry(self, attempt):
+        """Sleep with full jitter exponential backoff."""
+        time.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+    
+    def _begin_call(self):
+        # Raises CircuitOpenError while the breaker is open
+        probe = self.breaker.before_call()
+        self._incr('requests')
+        self._incr('in_flight')
+        return probe, time.monotonic()
+    
+    def _end_call(self, probe, started, failed):
+        elapsed = time.monotonic() - started
+        self.breaker.record(elapsed, failed, probe=probe)
+        self._incr('in_flight', -1)
+        self._incr('total_latency_ms', elapsed * 1000)
+    
+    def _send(self, method, path, base_url=None, read_timeout=None, **kwargs):
+        url = f"{(base_url or self.base_url).rstrip('/')}{path}"
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    return self.session.request(method, url, timeout=timeout, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout):
+                    # Only connection setup failures are retried; a read timeout
+                    # means the model may still be generating.
+                    if attempt >= self.max_retries:
+                        raise
+                    self._incr('retries')
+                    self._sleep_before_retry(attempt)
+                    attempt += 1
+        except requests.exceptions.RequestException as e:
+            self._incr('errors')
+            if isinstance(e, PoolTimeout):
+                self._incr('pool_timeouts')
+            raise
+    
+    def request(self, method, path, base_url=None, read_timeout=None, **kwargs):
+        """Send a request, retrying connection failures with jittered backoff.
+        
+        Raises CircuitOpenError without sending anything while the circuit breaker is open.
+        """
+        probe, started = self._begin_call()
+        failed = True
+        try:
+            response = self._send(method, path, base_url=base_url, read_timeout=read_timeout, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._end_call(probe, started, failed)
+    
+    def post(self, path, payload, **kwargs):
+        """POST a JSON payload."""
+        return self.request('POST', path, json=payload, **kwargs)
+    
+    def chat(self, model, messages, base_url=None, **options):
+        """Call /api/chat without streaming and return the response."""
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': False
+        }
+        payload.update(options)
+        return self.post('/api/chat', payload, base_url=base_url)
+    
+    def stream_chat(self, model, messages, base_url=None, **options):
+        """Call /api/chat with streaming and yield each decoded chunk.
+        
+        The breaker judges the whole stream: an error or timeout while reading
+        counts as a failure, and its full duration as the call latency.
+        """
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': True
+        }
+        payload.update(options)
+        probe, started = self._begin_call()
+        failed = True
+        try:
+            response = self._send('POST', '/api/chat', base_url=base_url, json=payload, stream=True)
+            try:
+                if response.status_code != 200:
+                    raise requests.exceptions.HTTPError(
+                        f"LLM service returned status {response.status_code}",
+                        response=response
+                    )
+                
+                # Ollama streams one JSON object per line until "done" is set
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise requests.exceptions.RequestException(chunk['error'])
+                    yield chunk
+                    if chunk.get('done'):
+                        break
+                failed = False
+            except GeneratorExit:
+                # The consumer stopped reading, which says nothing about the service
+                failed = False
+                raise
+            except (requests.exceptions.RequestException, ValueError):
+                self._incr('errors')
+                raise
+            finally:
+                # Returns the connection to the pool
+                response.close()
+        finally:
+            self._end_call(probe, started, failed)
+    
+    def embeddings(self, model, prompt, base_url=None):
+        """Get an embedding vector for a piece of text."""
+        response = self.post('/api/embeddings', {'model': model, 'prompt': prompt}, base_url=base_url)
+        response.raise_for_status()
+        return response.json().get('embedding', [])
+    
+    def get_pool_stats(self):
+        """Get connection pool statistics per host."""
+        pools = []
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'max_size': self.pool_size,
+                # urllib3 pre-fills the pool queue with None placeholders
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests
+            })
+        return pools
+    
+    def get_metrics(self):
+        """Get client metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+        
+        total_latency = stats.pop('total_latency_ms')
+        stats['avg_latency_ms'] = round(total_latency / stats['requests'], 2) if stats['requests'] else None
+        stats['pool_timeout'] = self.pool_timeout
+        stats['connect_timeout'] = self.connect_timeout
+        stats['read_timeout'] = self.read_timeout
+        stats['max_retries'] = self.max_retries
+        stats['breaker'] = self.breaker.get_stats()
+        stats['pools'] = self.get_pool_stats()
+        return stats
+    
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+def init_app(app):
+    """Create the shared LLM client for the application."""
+    client = LLMClient(
+        base_url=app.config['OLLAMA_BASE_URL'],
+        pool_size=app.config['OLLAMA_POOL_SIZE'],
+        pool_timeout=app.config['OLLAMA_POOL_TIMEOUT'],
+        connect_timeout=app.config['OLLAMA_CONNECT_TIMEOUT'],
+        read_timeout=app.config['OLLAMA_READ_TIMEOUT'],
+        max_retries=app.config['OLLAMA_MAX_RETRIES'],
+        retry_backoff=app.config['OLLAMA_RETRY_BACKOFF'],
+        breaker=CircuitBreaker(
+            failure_threshold=app.config['OLLAMA_BREAKER_FAILURE_THRESHOLD'],
+            reset_timeout=app.config['OLLAMA_BREAKER_RESET_TIMEOUT'],
+            slow_call_seconds=app.config['OLLAMA_BREAKER_SLOW_CALL_SECONDS'] or None,
+            window=app.config['OLLAMA_BREAKER_LATENCY_WINDOW']
+        )
+    )
+    app.extensions['llm_client'] = client
+    return client
+
+def get_llm_client():
+    """Get the shared LLM client of the current application."""
+    return current_app.extensions['llm_client']
@@ -0,0 +1,277 @@
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+import requests
+from flask import current_app
+
+from src.models import db
+from src.models.chat import ChatConversation, ChatJob
+from src.models.user import User
+from src.services.chat_service import search_knowledge_base, build_llm_messages, generate_response, is_opening_question
+from src.services.chat_turn import ChatTurn
+from src.services.conversation_memory import process_summary_job
+from src.services.redis_client import get_redis
+
+class MemoryJobQueue:
+    """In-process job queue, used when Redis is not available."""
+    
+    name = 'memory'
+    
+    def __init__(self, maxsize=0):
+        self._queue = queue.Queue(maxsize=maxsize)
+    
+    def put(self, item):
+        """Add an item, raising queue.Full when the queue is at capacity."""
+        self._queue.put_nowait(item)
+    
+    def get(self, timeout=1.0):
+        """Get the next item, or None after the timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def size(self):
+        return self._queue.qsize()
+
+class RedisJobQueue:
+    """Job queue backed by a Redis list shared by all API processes."""
+    
+    name = 'redis'
+    
+    def __init__(self, client, key='bewithu:llm_jobs', maxsize=0):
+        self.client = client
+        self.key = key
+        self.maxsize = maxsize
+    
+    def put(self, item):
+        """Add an item, raising queue.Full when the queue is at capacity."""
+        if self.maxsize and self.client.llen(self.key) >= self.maxsize:
+            raise queue.Full
+        self.client.lpush(self.key, item)
+    
+    def get(self, timeout=1.0):
+        """Get the next item, or None after the timeout."""
+        item = self.client.brpop(self.key, timeout=max(1, int(timeout)))
+        return item[1].decode() if item else None
+    
+    def size(self):
+        return self.client.llen(self.key)
+
+class LLMWorkerPool:
+    """Pool of background threads draining the LLM job queue."""
+    
+    def __init__(self, app, job_queue, workers=2):
+        self.app = app
+        self.queue = job_queue
+        self.workers = workers
+        self.handlers = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'processed': 0, 'failed': 0, 'busy': 0}
+    
+    def register_handler(self, kind, handler):
+        """Register the function processing jobs of a given kind."""
+        self.handlers[kind] = handler
+    
+    def submit(self, kind, job_id):
+        """Queue a job for processing."""
+        self.queue.put(f'{kind}:{job_id}')
+    
+    def start(self):
+        """Start worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'llm-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Signal worker threads to stop after their current job."""
+        self._stop.set()
+    
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self.queue.get(timeout=1.0)
+            except Exception as e:
+                print(f"LLM job queue error: {e}")
+                time.sleep(1)
+                continue
+            
+            if item is None:
+                continue
+            
+            kind, _, job_id = item.partition(':')
+            handler = self.handlers.get(kind)
+            if handler is None:
+                print(f"No handler for LLM job kind: {kind}")
+                continue
+            
+            self._incr('busy')
+            with self.app.app_context():
+                try:
+                    handler(job_id)
+                    self._incr('processed')
+                except Exception as e:
+                    db.session.rollback()
+                    self._incr('failed')
+                    print(f"LLM job {item} failed: {e}")
+                finally:
+                    db.session.remove()
+                    self._incr('busy', -1)
+    
+    def get_metrics(self):
+        """Get worker pool metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend'] = self.queue.name
+        stats['workers'] = self.workers
+        stats['alive_workers'] = sum(1 for thread in self._threads if thread.is_alive())
+        try:
+            stats['queue_size'] = self.queue.size()
+        except Exception:
+            stats['queue_size'] = None
+        return stats
+
+def is_allowed_callback(url):
+    """Check a callback URL against the configured host allowlist."""
+    parsed = urlparse(url)
+    return parsed.scheme in ['http', 'https'] and parsed.hostname in current_app.config['LLM_JOB_CALLBACK_HOSTS']
+
+def notify_callback(job):
+    """POST the finished job to its callback URL (best effort)."""
+    if not job.callback_url or not is_allowed_callback(job.callback_url):
+        return
+    
+    try:
+        requests.post(job.callback_url, json={'job': job.to_dict(include_messages=True)}, timeout=5)
+    except requests.exceptions.RequestException as e:
+        print(f"LLM job callback error for {job.id}: {e}")
+
+def process_chat_job(job_id):
+    """Generate the assistant reply for a queued chat job."""
+    # Claim the job atomically so it runs once even if queued twice
+    claimed = ChatJob.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'started_at': datetime.now(timezone.utc)},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return
+    
+    job = ChatJob.query.get(job_id)
+    try:
+        conversation = ChatConversation.query.get(job.conversation_id)
+        user = User.query.get(job.user_id)
+        content = job.user_message.content
+        language = user.language if user else 'ja'
+        
+        knowledge_results = search_knowledge_base(content, language)
+        llm_messages, prompt_info = build_llm_messages(conversation, content, knowledge_results, language)
+        ai_response, generation_info = generate_response(
+            llm_messages, content, language, knowledge_results,
+            opening=is_opening_question(conversation), request_class='job'
+        )
+        
+        # The reply, job status and audit entry are stored in one transaction
+        turn = ChatTurn(conversation)
+        assistant_message = turn.add_message(
+            'assistant',
+            ai_response,
+            metadata={
+                'knowledge_results': knowledge_results,
+                'model_used': generation_info['model_used'],
+                'has_knowledge_match': len(knowledge_results) > 0,
+                'cache_hit': generation_info['cache_hit'],
+                'fallback': generation_info['fallback'],
+                'prompt_tokens': generation_info['prompt_tokens'],
+                'completion_tokens': generation_info['completion_tokens'],
+                'prompt': prompt_info,
+                'job_id': job.id
+            }
+        )
+        
+        job.assistant_message_id = assistant_message.id
+        job.status = 'completed'
+        job.completed_at = datetime.now(timezone.utc)
+        
+        turn.log(job.user_id, job.user_message, assistant_message, job.ip_address, job.user_agent)
+        turn.commit()
+        
+    except Exception as e:
+        db.session.rollback()
+        job = ChatJob.query.get(job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.completed_at = datetime.now(timezone.utc)
+        db.session.commit()
+    
+    notify_callback(job)
+
+def create_job_queue(app):
+    """Create the job queue for the configured backend."""
+    backend = app.config['LLM_JOB_BACKEND']
+    maxsize = app.config['LLM_JOB_QUEUE_SIZE']
+    
+    if backend in ['auto', 'redis']:
+        client = get_redis(app)
+        if client is not None:
+            return RedisJobQueue(client, maxsize=maxsize)
+        if backend == 'redis':
+            print("Redis job backend requested but Redis is unavailable; using in-process queue")
+    
+    return MemoryJobQueue(maxsize=maxsize)
+
+def requeue_stale_jobs(timeout):
+    """Put jobs running for more than timeout seconds back in the queue; returns their ids.
+    
+    Such a job lost its worker to a crash or restart and would otherwise
+    stay running forever.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=timeout)
+    job_ids = [
+        job_id for job_id, in db.session.execute(
+            db.select(ChatJob.id).where(ChatJob.status == 'running', ChatJob.started_at < cutoff)
+        )
+    ]
+    if job_ids:
+        ChatJob.query.filter(ChatJob.id.in_(job_ids), ChatJob.status == 'running').update(
+            {'status': 'queued', 'started_at': None},
+            synchronize_session=False
+        )
+        db.session.commit()
+    return job_ids
+
+def init_app(app):
+    """Create and start the LLM worker pool."""
+    pool = LLMWorkerPool(app, create_job_queue(app), workers=app.config['LLM_JOB_WORKERS'])
+    pool.register_handler('chat', process_chat_job)
+    pool.register_handler('summary', process_summary_job)
+    app.extensions['llm_jobs'] = pool
+    
+    with app.app_context():
+        job_ids = requeue_stale_jobs(app.config['LLM_JOB_TIMEOUT'])
+        # An in-process queue does not survive restarts; requeue what was pending
+        if isinstance(pool.queue, MemoryJobQueue):
+            job_ids = [job.id for job in ChatJob.query.filter_by(status='queued').order_by(ChatJob.created_at).all()]
+        for job_id in job_ids:
+            try:
+                pool.submit('chat', job_id)
+            except queue.Full:
+                break
+    
+    if pool.workers > 0:
+        pool.start()
+    return pool
+
+def get_worker_pool():
+    """Get the LLM worker pool of the current application."""
+    return current_app.extensions['llm_jobs']
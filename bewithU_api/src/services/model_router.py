@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+
+from flask import current_app
+
+from src.models.system import SystemSetting
+
+# Settings naming the model for a language; other languages use the primary model
+LANGUAGE_MODEL_SETTINGS = {
+    'zh': 'llm_model_chinese'
+}
+
+# Request classes a user is waiting on; they fail fast when a model is
+# saturated, while queued jobs and summaries wait for a free slot
+INTERACTIVE_CLASSES = {'chat'}
+
+# Assumed generation time until a model has completed a request
+DEFAULT_SERVICE_SECONDS = 5.0
+MAX_RETRY_AFTER = 60
+
+class ModelBusy(Exception):
+    """Raised when a model has no free slot for an interactive request."""
+    
+    def __init__(self, model, retry_after):
+        super().__init__(f"Model {model} is busy")
+        self.model = model
+        self.retry_after = retry_after
+
+class ModelSlot:
+    """A held generation slot of a model; release() is safe to call more than once."""
+    
+    def __init__(self, gate):
+        self.gate = gate
+        self.acquired_at = time.monotonic()
+        self._released = False
+    
+    def release(self):
+        """Give the slot back."""
+        if self._released:
+            return
+        self._released = True
+        self.gate._release(time.monotonic() - self.acquired_at)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class ModelGate:
+    """Concurrency limit and bounded wait queue in front of one model."""
+    
+    def __init__(self, model, concurrency, queue_depth):
+        self.model = model
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._stats = {
+            'in_flight': 0,
+            'waiting': 0,
+            'admitted': 0,
+            'rejected': 0,
+            'timed_out': 0,
+            'completed': 0,
+            'total_service_seconds': 0.0
+        }
+    
+    def acquire(self, timeout=None):
+        """Take a slot, waiting at most timeout seconds (None: until one is free).
+        
+        Requests with a timeout are rejected at once when queue_depth
+        requests are already waiting.
+        """
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                if timeout is not None and self._stats['waiting'] >= self.queue_depth:
+                    self._stats['rejected'] += 1
+                    raise ModelBusy(self.model, self._retry_after())
+                self._stats['waiting'] += 1
+            try:
+                acquired = self._semaphore.acquire(timeout=timeout)
+            finally:
+                with self._lock:
+                    self._stats['waiting'] -= 1
+            if not acquired:
+                with self._lock:
+                    self._stats['timed_out'] += 1
+                    raise ModelBusy(self.model, self._retry_after())
+        
+        with self._lock:
+            self._stats['in_flight'] += 1
+            self._stats['admitted'] += 1
+        return ModelSlot(self)
+    
+    def _release(self, seconds):
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            self._stats['completed'] += 1
+            self._stats['total_service_seconds'] += seconds
+        self._semaphore.release()
+    
+    def _retry_after(self):
+        # Time for the requests ahead to drain through the slots; called with the lock held
+        completed = self._stats['completed']
+        service = self._stats['total_service_seconds'] / completed if completed else DEFAULT_SERVICE_SECONDS
+        estimate = service * (self._stats['waiting'] + 1) / self.concurrency
+        return min(max(math.ceil(estimate), 1), MAX_RETRY_AFTER)
+    
+    def get_stats(self):
+        """Get gate statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+        total_service = stats.pop('total_service_seconds')
+        stats['avg_service_ms'] = round(total_service * 1000 / stats['completed'], 2) if stats['completed'] else None
+        stats['concurrency'] = self.concurrency
+        stats['queue_depth'] = self.queue_depth
+        return stats
+
+class ModelRouter:
+    """Pick the model for a request and limit concurrent generations per model."""
+    
+    def __init__(self, concurrency=2, queue_depth=8, queue_timeout=5.0, limits=None):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.limits = limits or {}
+        self._gates = {}
+        self._lock = threading.Lock()
+    
+    def select(self, language=None, request_class='chat'):
+        """Get the model for a user language and request class.
+        
+        Checked in order: the llm_model_<request_class> setting, the setting
+        for the language, llm_model_primary and default_llm_model.
+        """
+        keys = [f'llm_model_{request_class}']
+        base_language = (language or '').split('-')[0].lower()
+        if base_language in LANGUAGE_MODEL_SETTINGS:
+            keys.append(LANGUAGE_MODEL_SETTINGS[base_language])
+        keys.extend(['llm_model_primary', 'default_llm_model'])
+        
+        for key in keys:
+            model = SystemSetting.get_setting(key)
+            if model:
+                return model
+        return 'llama2'
+    
+    def gate(self, model):
+        """Get the gate of a model, creating it on first use."""
+        gate = self._gates.get(model)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.get(model)
+                if gate is None:
+                    concurrency, queue_depth = self.limits.get(model, (self.concurrency, self.queue_depth))
+                    gate = self._gates[model] = ModelGate(model, concurrency, queue_depth)
+        return gate
+    
+    def acquire(self, model, request_class='chat'):
+        """Take a generation slot of a model, raising ModelBusy if an interactive request cannot get one in time."""
+        timeout = self.queue_timeout if request_class in INTERACTIVE_CLASSES else None
+        return self.gate(model).acquire(timeout=timeout)
+    
+    def get_stats(self):
+        """Get router statistics per model."""
+        with self._lock:
+            gates = dict(self._gates)
+        return {
+            'queue_timeout': self.queue_timeout,
+            'models': {model: gate.get_stats() for model, gate in gates.items()}
+        }
+
+def parse_limits(value):
+    """Parse per-model limits written as 'model=concurrency[/queue_depth],...'."""
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        model, _, limit = item.strip().rpartition('=')
+        concurrency, _, queue_depth = limit.partition('/')
+        limits[model] = (int(concurrency), int(queue_depth) if queue_depth else None)
+    return limits
+
+def init_app(app):
+    """Create the model router of the application."""
+    concurrency = app.config['LLM_MODEL_CONCURRENCY']
+    queue_depth = app.config['LLM_MODEL_QUEUE_DEPTH']
+    limits = {
+        model: (model_concurrency, queue_depth if model_depth is None else model_depth)
+        for model, (model_concurrency, model_depth) in parse_limits(app.config['LLM_MODEL_LIMITS']).items()
+    }
+    router = ModelRouter(
+        concurrency=concurrency,
+        queue_depth=queue_depth,
+        queue_timeout=app.config['LLM_MODEL_QUEUE_TIMEOUT'],
+        limits=limits
+    )
+    app.extensions['model_router'] = router
+    return router
+
+def get_model_router():
+    """Get the model router of the current application."""
+    return current_app.extensions['model_router']
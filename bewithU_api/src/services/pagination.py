@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import DateTime, literal, tuple_
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that cannot be decoded for the requested listing."""
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    data = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor into typed values for the given sort columns."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor(cursor)
+    
+    decoded = []
+    for value, column in zip(values, columns):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursor(cursor)
+        decoded.append(value)
+    return decoded
+
+def paginate(query, sort_column, id_column, page=1, per_page=20):
+    """Get (items, pagination) newest first, by page number or by keyset when ?cursor= is given.
+    
+    Page mode keeps any ordering already on the query and only breaks its
+    ties by (sort, id).
+    """
+    columns = [sort_column, id_column]
+    order = [sort_column.desc(), id_column.desc()]
+    
+    if 'cursor' not in request.args:
+        result = query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False)
+        return result.items, {
+            'page': page,
+            'per_page': per_page,
+            'total': result.total,
+            'pages': result.pages,
+            'has_next': result.has_next,
+            'has_prev': result.has_prev
+        }
+    
+    # Keyset mode seeks past the last (sort, id) seen instead of counting and
+    # skipping rows, so every page costs the same; it replaces any ordering
+    # already on the query (e.g. search relevance) with the keyset order
+    per_page = max(per_page, 1)
+    cursor = request.args.get('cursor', '').strip()
+    keyset = query.order_by(None)
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        keyset = keyset.filter(tuple_(*columns) < tuple_(*[literal(value, column.type) for value, column in zip(values, columns)]))
+    rows = keyset.order_by(*order).limit(per_page + 1).all()
+    items = rows[:per_page]
+    has_next = len(rows) > per_page
+    
+    pagination = {
+        'per_page': per_page,
+        'cursor': cursor or None,
+        'next_cursor': encode_cursor([getattr(items[-1], sort_column.key), getattr(items[-1], id_column.key)]) if has_next else None,
+        'has_next': has_next
+    }
+    # Counting is the expensive part of offset pagination; only on request
+    if request.args.get('include_total', 'false').lower() == 'true':
+        pagination['total'] = query.order_by(None).count()
+    return items, pagination
@@ -0,0 +1,81 @@
+from src.services.tokenizers import estimate_tokens
+
+# Chat formats add a few tokens of framing per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def truncate_to_tokens(text, max_tokens, count_tokens=estimate_tokens):
+    """Cut a text down to about max_tokens tokens."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[:max(int(len(text) * max_tokens / tokens) - 1, 0)] + '…'
+
+class PromptSegment:
+    """One piece of a prompt: part of the system prompt or a chat message."""
+    
+    def __init__(self, group, text, role='system', value=0, required=False):
+        self.group = group
+        self.text = text
+        self.role = role
+        self.value = value
+        self.required = required
+        self.tokens = 0
+
+class PromptBuilder:
+    """Assemble LLM chat messages from segments, dropping the least valuable ones to fit a token budget.
+    
+    System segments are joined, in the order added, into one system message;
+    other segments become chat messages. Required segments are always kept.
+    """
+    
+    def __init__(self, budget, count_tokens=estimate_tokens):
+        self.budget = budget
+        self.count_tokens = count_tokens
+        self.segments = []
+    
+    def system(self, group, text, value=0, required=False):
+        """Add part of the system prompt."""
+        return self._add(PromptSegment(group, text, value=value, required=required))
+    
+    def message(self, group, role, text, value=0, required=False, max_tokens=None):
+        """Add a chat message, optionally truncated to max_tokens."""
+        if max_tokens is not None:
+            text = truncate_to_tokens(text, max_tokens, self.count_tokens)
+        return self._add(PromptSegment(group, text, role=role, value=value, required=required))
+    
+    def _add(self, segment):
+        segment.tokens = self.count_tokens(segment.text)
+        if segment.role != 'system':
+            segment.tokens += MESSAGE_OVERHEAD_TOKENS
+        self.segments.append(segment)
+        return segment
+    
+    def build(self):
+        """Get (messages, report) with the segments that fit the budget."""
+        kept = list(self.segments)
+        total = sum(segment.tokens for segment in kept) + MESSAGE_OVERHEAD_TOKENS
+        dropped = []
+        # Least valuable first; among equals the earliest added goes first
+        for segment in sorted((segment for segment in kept if not segment.required), key=lambda segment: segment.value):
+            if total <= self.budget:
+                break
+            kept.remove(segment)
+            dropped.append(segment)
+            total -= segment.tokens
+        
+        system_text = ''.join(segment.text for segment in kept if segment.role == 'system')
+        messages = [{'role': 'system', 'content': system_text}]
+        messages.extend({'role': segment.role, 'content': segment.text} for segment in kept if segment.role != 'system')
+        
+        segments = {}
+        for segment in kept:
+            segments[segment.group] = segments.get(segment.group, 0) + segment.tokens
+        report = {
+            'budget': self.budget,
+            'estimated_tokens': total,
+            'segments': segments,
+            'dropped': {}
+        }
+        for segment in dropped:
+            report['dropped'][segment.group] = report['dropped'].get(segment.group, 0) + 1
+        return messages, report
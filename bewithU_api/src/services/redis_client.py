@@ -0,0 +1,27 @@
+from flask import current_app
+
+def connect(url):
+    """Connect to Redis, returning None when it is not installed or reachable."""
+    if not url:
+        return None
+    
+    try:
+        import redis
+    except ImportError:
+        return None
+    
+    try:
+        client = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=5)
+        client.ping()
+        return client
+    except Exception as e:
+        print(f"Redis unavailable at {url}: {e}")
+        return None
+
+def get_redis(app=None):
+    """Get the shared Redis client of the application, or None."""
+    app = app or current_app
+    if 'redis' not in app.extensions:
+        # Resolve once per process; a failed connection is cached as None
+        app.extensions['redis'] = connect(app.config.get('REDIS_URL'))
+    return app.extensions['redis']
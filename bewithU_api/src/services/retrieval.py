@@ -0,0 +1,149 @@
+import math
+from collections import Counter
+
+from flask import current_app
+
+from src.models.knowledge import KnowledgeArticle
+from src.services import knowledge_events
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.tokenizers import create_tokenizers, estimate_tokens, get_token_counter
+from src.services.vector_index import article_chunks, get_vector_index
+
+def article_header(article):
+    """Get the title/summary header an article's passages are shown under."""
+    header = article.title
+    if article.summary:
+        header += '\n' + article.summary
+    return header
+
+def lexical_passages(query, language, articles):
+    """Rank passages of lexically matched articles by query term overlap."""
+    tokenizers = create_tokenizers(current_app)
+    terms = set(tokenizers.tokenize(query, language))
+    chunk_size = current_app.config['VECTOR_INDEX_CHUNK_SIZE']
+    chunk_overlap = current_app.config['VECTOR_INDEX_CHUNK_OVERLAP']
+    
+    passages = []
+    for rank, article in enumerate(articles):
+        snapshot = knowledge_events.snapshot(article, 'insert')
+        for text in article_chunks(snapshot, chunk_size, chunk_overlap):
+            frequencies = Counter(token for token in tokenizers.tokenize(text, article.language) if token in terms)
+            passages.append({'article_id': article.id, 'text': text, 'rank': rank, 'frequencies': frequencies})
+    
+    # Weight terms by rarity across the candidate passages
+    document_frequency = Counter(term for passage in passages for term in passage['frequencies'])
+    for passage in passages:
+        passage['score'] = sum(
+            (1 + math.log(frequency)) * math.log(1 + len(passages) / document_frequency[term])
+            for term, frequency in passage.pop('frequencies').items()
+        )
+    
+    # Every matched article keeps its header; body passages need an overlap
+    headers = {article.id: article_header(article) for article in articles}
+    passages = [p for p in passages if p['score'] > 0 or p['text'] == headers[p['article_id']]]
+    passages.sort(key=lambda p: (-p['score'], p['rank']))
+    return passages
+
+def vector_passages(query, language, limit):
+    """Rank passages by embedding similarity, or None when the index or the embedding service is not available."""
+    index = get_vector_index()
+    if index is None or not index.ready:
+        return None
+    
+    try:
+        results = index.search(
+            query,
+            k=limit,
+            language=language,
+            min_score=current_app.config['VECTOR_INDEX_MIN_SCORE']
+        )
+    except CircuitOpenError:
+        # Query embeddings come from the LLM service; lexical search stands in while it is down
+        return None
+    return [{'article_id': chunk['article_id'], 'text': chunk['text'], 'score': score} for chunk, score in results]
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked passage lists by reciprocal rank."""
+    fused = {}
+    for ranking in rankings:
+        for rank, passage in enumerate(ranking):
+            key = (passage['article_id'], passage['text'])
+            entry = fused.setdefault(key, {'article_id': passage['article_id'], 'text': passage['text'], 'score': 0.0})
+            entry['score'] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda passage: passage['score'], reverse=True)
+
+def select_passages(passages, articles, budget, max_articles, count_tokens=estimate_tokens):
+    """Pick the best passages that fit the token budget, grouped by article."""
+    results = {}
+    used = 0
+    for passage in passages:
+        article = articles.get(passage['article_id'])
+        if article is None:
+            continue
+        
+        header = article_header(article)
+        result = results.get(article.id)
+        cost = 0
+        if result is None:
+            if len(results) >= max_articles:
+                continue
+            cost += count_tokens(header)
+        is_header = passage['text'] == header
+        if not is_header:
+            cost += count_tokens(passage['text'])
+        if used + cost > budget:
+            continue
+        
+        used += cost
+        if result is None:
+            result = results[article.id] = {'article': article, 'passages': []}
+        if not is_header:
+            result['passages'].append(passage['text'])
+    
+    return list(results.values())
+
+def retrieve_passages(query, language):
+    """Get knowledge results with the passages most relevant to a query."""
+    config = current_app.config
+    mode = config['KNOWLEDGE_RETRIEVAL_MODE']
+    candidates = config['RETRIEVAL_CANDIDATES']
+    
+    rankings = []
+    articles = {}
+    if mode in ('vector', 'hybrid'):
+        ranking = vector_passages(query, language, limit=candidates * 3)
+        if ranking is not None:
+            rankings.append(ranking)
+            ids = {passage['article_id'] for passage in ranking}
+            if ids:
+                for article in KnowledgeArticle.query.filter(
+                    KnowledgeArticle.id.in_(ids),
+                    KnowledgeArticle.status == 'published'
+                ):
+                    articles[article.id] = article
+    
+    # Lexical search also serves vector mode while the vector index is building
+    if mode != 'vector' or not rankings:
+        matched = KnowledgeArticle.search(query=query, language=language, status='published').limit(candidates).all()
+        rankings.append(lexical_passages(query, language, matched))
+        articles.update((article.id, article) for article in matched)
+    
+    passages = rankings[0] if len(rankings) == 1 else reciprocal_rank_fusion(rankings)
+    selected = select_passages(
+        passages, articles, config['RETRIEVAL_TOKEN_BUDGET'], config['RETRIEVAL_MAX_ARTICLES'], count_tokens=get_token_counter()
+    )
+    
+    results = []
+    for item in selected:
+        article = item['article']
+        preview = item['passages'][0] if item['passages'] else article.content
+        results.append({
+            'id': article.id,
+            'title': article.title,
+            'summary': article.summary,
+            'passages': item['passages'],
+            'content_preview': preview[:200] + '...' if len(preview) > 200 else preview,
+            'url': f'/knowledge/articles/{article.id}',
+            'updated_at': article.updated_at.isoformat() if article.updated_at else None
+        })
+    return results
@@ -0,0 +1,251 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from src.models import db
+from src.models.user import UserSession
+from src.services.cache import TTLCache
+from src.services.redis_client import get_redis
+
+_registered = False
+
+# Caches a token only if neither it nor its user was invalidated within the TTL
+REMEMBER_SCRIPT = """
+if redis.call('exists', KEYS[3]) == 1 or redis.call('exists', KEYS[4]) == 1 then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('sadd', KEYS[2], ARGV[3])
+redis.call('expire', KEYS[2], ARGV[4])
+return 1
+"""
+
+def remaining_seconds(expires_at, ttl):
+    """Get how long a valid session may be cached: the TTL, capped at its expiry."""
+    if expires_at is None:
+        return ttl
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return min(ttl, int((expires_at - datetime.now(timezone.utc)).total_seconds()))
+
+class MemoryRevocationCache:
+    """In-process cache of tokens known to belong to a live session."""
+    
+    name = 'memory'
+    
+    def __init__(self, maxsize=10000, ttl=30):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self.ttl = ttl
+        self._user_tokens = defaultdict(set)  # user id -> cached jtis
+        # Tokens and users invalidated within the TTL; a lookup that read the
+        # session row before the invalidation must not cache it afterwards
+        self._revoked = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._revoke_lock = threading.Lock()
+    
+    def _forget(self, jti, user_id):
+        with self._lock:
+            tokens = self._user_tokens.get(user_id)
+            if tokens is not None:
+                tokens.discard(jti)
+                if not tokens:
+                    del self._user_tokens[user_id]
+    
+    def is_valid(self, jti):
+        """Check whether a token was recently confirmed to have a live session."""
+        return self.cache.get(jti) is not None
+    
+    def remember(self, jti, user_id, expires_at=None):
+        """Cache a token confirmed to have a live session."""
+        ttl = remaining_seconds(expires_at, self.ttl)
+        if ttl <= 0:
+            return
+        with self._revoke_lock:
+            if ('token', jti) in self._revoked or ('user', user_id) in self._revoked:
+                return
+            self.cache.set(jti, user_id, ttl=ttl)
+            with self._lock:
+                self._user_tokens[user_id].add(jti)
+    
+    def invalidate(self, jti):
+        """Forget a token, e.g. after logout or session revocation."""
+        with self._revoke_lock:
+            self._revoked.set(('token', jti), True)
+            self.cache.delete(jti)
+    
+    def invalidate_user(self, user_id):
+        """Forget every cached token of a user."""
+        with self._revoke_lock:
+            self._revoked.set(('user', user_id), True)
+            with self._lock:
+                tokens = list(self._user_tokens.get(user_id, ()))
+            for jti in tokens:
+                self.cache.delete(jti)
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        return dict(self.cache.get_stats(), backend=self.name)
+
+class RedisRevocationCache:
+    """Revocation cache shared by all API processes through Redis."""
+    
+    name = 'redis'
+    
+    def __init__(self, client, ttl=30, prefix='bewithu:session'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._remember = client.register_script(REMEMBER_SCRIPT)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    def _token_key(self, jti):
+        return f'{self.prefix}:token:{jti}'
+    
+    def _user_key(self, user_id):
+        return f'{self.prefix}:user:{user_id}'
+    
+    def _revoked_key(self, kind, value):
+        return f'{self.prefix}:revoked:{kind}:{value}'
+    
+    def is_valid(self, jti):
+        """Check whether a token was recently confirmed to have a live session."""
+        try:
+            found = self.client.exists(self._token_key(jti))
+        except Exception:
+            # Fall back to the database rather than failing the request
+            self.errors += 1
+            found = False
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return bool(found)
+    
+    def remember(self, jti, user_id, expires_at=None):
+        """Cache a token confirmed to have a live session."""
+        ttl = remaining_seconds(expires_at, self.ttl)
+        if ttl <= 0:
+            return
+        try:
+            self._remember(
+                keys=[
+                    self._token_key(jti),
+                    self._user_key(user_id),
+                    self._revoked_key('token', jti),
+                    self._revoked_key('user', user_id)
+                ],
+                args=[user_id, ttl, jti, self.ttl]
+            )
+        except Exception:
+            self.errors += 1
+    
+    def invalidate(self, jti):
+        """Forget a token, e.g. after logout or session revocation."""
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(self._revoked_key('token', jti), 1, ex=self.ttl)
+            pipe.delete(self._token_key(jti))
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"Revocation cache invalidation error: {e}")
+    
+    def invalidate_user(self, user_id):
+        """Forget every cached token of a user."""
+        try:
+            self.client.set(self._revoked_key('user', user_id), 1, ex=self.ttl)
+            tokens = self.client.smembers(self._user_key(user_id))
+            keys = [self._token_key(jti.decode()) for jti in tokens]
+            self.client.delete(self._user_key(user_id), *keys)
+        except Exception as e:
+            self.errors += 1
+            print(f"Revocation cache invalidation error: {e}")
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.name,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+def create_revocation_cache(app):
+    """Create the revocation cache for the configured backend."""
+    backend = app.config['REVOCATION_CACHE_BACKEND']
+    ttl = app.config['REVOCATION_CACHE_TTL']
+    
+    if backend in ['auto', 'redis']:
+        client = get_redis(app)
+        if client is not None:
+            return RedisRevocationCache(client, ttl=ttl)
+        if backend == 'redis':
+            print("Redis revocation cache requested but Redis is unavailable; using in-process cache")
+    
+    return MemoryRevocationCache(maxsize=app.config['REVOCATION_CACHE_SIZE'], ttl=ttl)
+
+def _record(user_session, tokens):
+    session = object_session(user_session)
+    if session is not None:
+        session.info.setdefault('revoked_tokens', set()).update(tokens)
+
+def _after_delete(mapper, connection, user_session):
+    _record(user_session, [user_session.token_hash])
+
+def _after_update(mapper, connection, user_session):
+    # Refreshing a session replaces its token; drop the old one
+    history = inspect(user_session).attrs.token_hash.history
+    if history.deleted:
+        _record(user_session, history.deleted)
+
+def invalidate_user_on_commit(user_id):
+    """Forget the cached tokens of a user once the current transaction commits.
+    
+    For bulk session deletes, which bypass the mapper listeners.
+    """
+    db.session.info.setdefault('revoked_users', set()).add(user_id)
+
+def _after_commit(session):
+    # Invalidate only once the change is visible, so a lookup cannot
+    # re-cache the old session row afterwards
+    tokens = session.info.pop('revoked_tokens', None)
+    user_ids = session.info.pop('revoked_users', None)
+    if not (tokens or user_ids) or not has_app_context():
+        return
+    
+    cache = current_app.extensions.get('revocation_cache')
+    if cache is not None:
+        for jti in tokens or ():
+            cache.invalidate(jti)
+        for user_id in user_ids or ():
+            cache.invalidate_user(user_id)
+
+def _after_rollback(session):
+    session.info.pop('revoked_tokens', None)
+    session.info.pop('revoked_users', None)
+
+def init_app(app):
+    """Create the revocation cache and invalidate it when sessions change."""
+    global _registered
+    if app.config['REVOCATION_CACHE_TTL'] > 0:
+        app.extensions['revocation_cache'] = create_revocation_cache(app)
+    
+    if not _registered:
+        event.listen(UserSession, 'after_delete', _after_delete)
+        event.listen(UserSession, 'after_update', _after_update)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+        _registered = True
+
+def get_revocation_cache():
+    """Get the revocation cache of the current application, or None when disabled."""
+    return current_app.extensions.get('revocation_cache')
@@ -0,0 +1,370 @@
+import atexit
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+
+from flask import current_app
+
+from src.models import db
+from src.models.knowledge import KnowledgeArticle
+from src.services import knowledge_events
+from src.services.snapshot_files import snapshot_reader, snapshot_writer
+from src.services.tokenizers import create_tokenizers
+
+# Term frequency multipliers so title and summary matches outrank body matches
+FIELD_WEIGHTS = {'title': 3, 'summary': 2, 'content': 1}
+
+# Upper bound on ranked ids handed to the database per query
+MAX_RESULTS = 200
+
+class InvertedIndex:
+    """In-process inverted index over published knowledge articles."""
+    
+    name = 'ngram'
+    
+    def __init__(self, tokenizers, path=None):
+        self.tokenizers = tokenizers
+        self.path = path
+        # Postings are parallel compact arrays; removed documents are
+        # tombstoned and dropped once enough of them accumulate
+        self.postings = {}             # term -> (array('I') doc numbers, array('H') frequencies)
+        self.doc_ids = []              # doc number -> article id, None once removed
+        self.doc_languages = []        # doc number -> article language
+        self.doc_lengths = array('I')  # doc number -> weighted token count
+        self.doc_numbers = {}          # article id -> doc number
+        self.total_length = 0
+        self.removed = 0
+        self.watermark = None          # latest article updated_at applied to the index (aware UTC)
+        self.dirty = False             # changed since the last snapshot
+        self.ready = False
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.doc_numbers)
+    
+    def document_terms(self, article):
+        """Get weighted term frequencies of an article snapshot."""
+        tokenizer = self.tokenizers.for_language(article['language'])
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenizer.tokenize(article.get(field)):
+                frequencies[token] += weight
+        return frequencies
+    
+    def add_article(self, article):
+        """Index (or re-index) a published article snapshot."""
+        frequencies = self.document_terms(article)
+        with self._lock:
+            self._remove(article['id'])
+            number = len(self.doc_ids)
+            self.doc_ids.append(article['id'])
+            self.doc_languages.append(article['language'])
+            length = sum(frequencies.values())
+            self.doc_lengths.append(length)
+            self.doc_numbers[article['id']] = number
+            self.total_length += length
+            
+            for term, frequency in frequencies.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array('I'), array('H'))
+                postings[0].append(number)
+                postings[1].append(min(frequency, 0xFFFF))
+            self._advance(article.get('updated_at'))
+    
+    def remove_article(self, article_id):
+        """Remove an article from the index."""
+        with self._lock:
+            self._remove(article_id)
+            self.dirty = True
+    
+    def _advance(self, updated_at):
+        self.dirty = True
+        updated_at = knowledge_events.change_time(updated_at)
+        if updated_at and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+    
+    def _remove(self, article_id):
+        number = self.doc_numbers.pop(article_id, None)
+        if number is None:
+            return
+        
+        self.doc_ids[number] = None
+        self.total_length -= self.doc_lengths[number]
+        self.removed += 1
+        if self.removed > 64 and self.removed * 4 > len(self.doc_ids):
+            self._compact()
+    
+    def _compact(self):
+        # Renumber live documents and rewrite postings without tombstones
+        renumber = {}
+        doc_ids, doc_languages, doc_lengths = [], [], array('I')
+        for number, article_id in enumerate(self.doc_ids):
+            if article_id is None:
+                continue
+            renumber[number] = len(doc_ids)
+            doc_ids.append(article_id)
+            doc_languages.append(self.doc_languages[number])
+            doc_lengths.append(self.doc_lengths[number])
+        
+        postings = {}
+        for term, (numbers, frequencies) in self.postings.items():
+            kept = [(renumber[number], frequency) for number, frequency in zip(numbers, frequencies) if number in renumber]
+            if kept:
+                postings[term] = (array('I', [n for n, _ in kept]), array('H', [f for _, f in kept]))
+        
+        self.postings = postings
+        self.doc_ids, self.doc_languages, self.doc_lengths = doc_ids, doc_languages, doc_lengths
+        self.doc_numbers = {article_id: number for number, article_id in enumerate(doc_ids)}
+        self.removed = 0
+    
+    def term_weight(self, document_frequency):
+        """Get the weight of a query term (idf)."""
+        return math.log(1 + len(self.doc_numbers) / document_frequency)
+    
+    def score(self, frequency, weight, number):
+        """Score one term occurrence in a document (tf-idf)."""
+        return (1 + math.log(frequency)) * weight
+    
+    def rank(self, score, matched, term_count):
+        """Get the final document score, favouring coverage of the query terms."""
+        return score * matched / term_count
+    
+    def search(self, query, language=None, limit=MAX_RESULTS):
+        """Get (article id, score) pairs for a query, best first."""
+        terms = set(self.tokenizers.tokenize(query, language))
+        if not terms:
+            return []
+        
+        with self._lock:
+            scores = {}
+            matched = Counter()
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                numbers, frequencies = postings
+                weight = self.term_weight(len(numbers))
+                for number, frequency in zip(numbers, frequencies):
+                    if self.doc_ids[number] is None:
+                        continue
+                    if language and self.doc_languages[number] != language:
+                        continue
+                    scores[number] = scores.get(number, 0.0) + self.score(frequency, weight, number)
+                    matched[number] += 1
+            
+            ranked = heapq.nlargest(
+                limit,
+                ((self.rank(score, matched[number], len(terms)), number) for number, score in scores.items())
+            )
+            return [(self.doc_ids[number], score) for score, number in ranked]
+    
+    def apply(self, articles, query, language=None):
+        """Restrict an article query to index matches, ordered by relevance."""
+        ids = [article_id for article_id, _ in self.search(query, language)]
+        if not ids:
+            return articles.filter(db.false())
+        
+        order = db.case({article_id: position for position, article_id in enumerate(ids)}, value=KnowledgeArticle.id)
+        return articles.filter(KnowledgeArticle.id.in_(ids)).order_by(order)
+    
+    def build(self, articles):
+        """Rebuild the index from article snapshots."""
+        with self._lock:
+            self.postings = {}
+            self.doc_ids, self.doc_languages, self.doc_lengths = [], [], array('I')
+            self.doc_numbers = {}
+            self.total_length = 0
+            self.removed = 0
+            self.watermark = None
+        for article in articles:
+            self.add_article(article)
+        self.ready = True
+    
+    def apply_changes(self, changes):
+        """Apply committed knowledge article changes."""
+        for change in changes:
+            if change['change'] != 'delete' and change['status'] == 'published':
+                self.add_article(change)
+            else:
+                self.remove_article(change['id'])
+            with self._lock:
+                self._advance(change['updated_at'])
+    
+    def catch_up(self):
+        """Apply article changes committed after the snapshot. Returns whether the index is consistent."""
+        changed = KnowledgeArticle.query
+        if self.watermark:
+            changed = changed.filter(KnowledgeArticle.updated_at > self.watermark)
+        self.apply_changes([knowledge_events.snapshot(article, 'update') for article in changed.all()])
+        
+        # Deleted articles leave no trace to catch up on; rebuild if the counts disagree
+        return KnowledgeArticle.query.filter_by(status='published').count() == len(self.doc_numbers)
+    
+    def save(self):
+        """Snapshot the index to disk."""
+        if not self.path:
+            return
+        
+        with self._lock:
+            if self.removed:
+                self._compact()
+            terms, counts = [], []
+            numbers, frequencies = array('I'), array('H')
+            for term, (term_numbers, term_frequencies) in self.postings.items():
+                terms.append(term)
+                counts.append(len(term_numbers))
+                numbers.extend(term_numbers)
+                frequencies.extend(term_frequencies)
+            meta = {
+                'engine': self.name,
+                'tokenizer': self.tokenizers.name,
+                'watermark': self.watermark.isoformat() if self.watermark else None,
+                'doc_ids': list(self.doc_ids),
+                'doc_languages': list(self.doc_languages),
+                'terms': terms,
+                'counts': counts
+            }
+            doc_lengths = array('I', self.doc_lengths)
+            self.dirty = False
+        
+        # Write to temporary files first so a crash never leaves a torn snapshot
+        with snapshot_writer(self.path) as open_file:
+            with open_file('postings.bin') as f:
+                doc_lengths.tofile(f)
+                numbers.tofile(f)
+                frequencies.tofile(f)
+            with open_file('index.json', 'w') as f:
+                json.dump(meta, f, ensure_ascii=False)
+    
+    def load(self):
+        """Load a snapshot written by save(). Returns success."""
+        if not self.path:
+            return False
+        
+        meta_path = os.path.join(self.path, 'index.json')
+        postings_path = os.path.join(self.path, 'postings.bin')
+        if not os.path.exists(meta_path) or not os.path.exists(postings_path):
+            return False
+        
+        with snapshot_reader(self.path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('engine') != self.name or meta.get('tokenizer') != self.tokenizers.name:
+                # Postings from another engine or tokenizer are not comparable
+                return False
+            
+            doc_count, posting_count = len(meta['doc_ids']), sum(meta['counts'])
+            doc_lengths, numbers, frequencies = array('I'), array('I'), array('H')
+            try:
+                with open(postings_path, 'rb') as f:
+                    doc_lengths.fromfile(f, doc_count)
+                    numbers.fromfile(f, posting_count)
+                    frequencies.fromfile(f, posting_count)
+            except EOFError:
+                return False
+        
+        postings = {}
+        offset = 0
+        for term, count in zip(meta['terms'], meta['counts']):
+            postings[term] = (numbers[offset:offset + count], frequencies[offset:offset + count])
+            offset += count
+        
+        with self._lock:
+            self.postings = postings
+            self.doc_ids = meta['doc_ids']
+            self.doc_languages = meta['doc_languages']
+            self.doc_lengths = doc_lengths
+            self.doc_numbers = {article_id: number for number, article_id in enumerate(self.doc_ids)}
+            self.total_length = sum(doc_lengths)
+            self.removed = 0
+            self.watermark = knowledge_events.change_time(meta['watermark'])
+            self.dirty = False
+        self.ready = True
+        return True
+    
+    def get_stats(self):
+        """Get index statistics."""
+        return {
+            'engine': self.name,
+            'ready': self.ready,
+            'articles': len(self.doc_numbers),
+            'terms': len(self.postings),
+            'postings': sum(len(numbers) for numbers, _ in self.postings.values()),
+            'tombstones': self.removed,
+            'watermark': self.watermark.isoformat() if self.watermark else None
+        }
+
+class BM25Index(InvertedIndex):
+    """Inverted index ranked with Okapi BM25."""
+    
+    name = 'bm25'
+    
+    def __init__(self, tokenizers, path=None, k1=1.2, b=0.75):
+        super().__init__(tokenizers, path=path)
+        self.k1 = k1
+        self.b = b
+    
+    def term_weight(self, document_frequency):
+        """Get the weight of a query term (BM25 idf)."""
+        count = len(self.doc_numbers)
+        return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+    
+    def score(self, frequency, weight, number):
+        """Score one term occurrence in a document (BM25)."""
+        average_length = self.total_length / len(self.doc_numbers) if self.doc_numbers else 1
+        norm = 1 - self.b + self.b * self.doc_lengths[number] / (average_length or 1)
+        return weight * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+    
+    def rank(self, score, matched, term_count):
+        """Get the final document score."""
+        return score
+
+def published_snapshots():
+    """Get snapshots of all published articles."""
+    articles = KnowledgeArticle.query.filter_by(status='published').all()
+    return [knowledge_events.snapshot(article, 'insert') for article in articles]
+
+def _snapshot_periodically(index, interval):
+    while True:
+        time.sleep(interval)
+        if index.dirty:
+            try:
+                index.save()
+            except Exception as e:
+                print(f"Search index snapshot error: {e}")
+
+def init_app(app):
+    """Load or build the in-process search index and keep it in sync."""
+    tokenizers = create_tokenizers(app)
+    index_class = BM25Index if app.config['KNOWLEDGE_SEARCH_ENGINE'] == 'bm25' else InvertedIndex
+    index = index_class(tokenizers, path=app.config['SEARCH_INDEX_PATH'])
+    
+    with app.app_context():
+        if not (index.load() and index.catch_up()):
+            index.build(published_snapshots())
+        if index.dirty:
+            index.save()
+    
+    knowledge_events.subscribe(index.apply_changes)
+    if index.path:
+        # Snapshot edits in the background rather than on the committing request
+        threading.Thread(
+            target=_snapshot_periodically,
+            args=(index, app.config['SEARCH_INDEX_SNAPSHOT_INTERVAL']),
+            name='search-index-snapshot',
+            daemon=True
+        ).start()
+        atexit.register(lambda: index.dirty and index.save())
+    
+    app.extensions['search_index'] = index
+    return index
+
+def get_search_index():
+    """Get the search index of the current application, or None when disabled."""
+    return current_app.extensions.get('search_index')
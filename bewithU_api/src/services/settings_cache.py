@@ -0,0 +1,170 @@
+import copy
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from src.models import db
+from src.models.system import SystemSetting
+from src.services.redis_client import get_redis
+
+_registered = False
+
+class DatabaseSettingsVersion:
+    """Settings version read from the row count and latest update time."""
+    
+    name = 'database'
+    
+    def read(self):
+        """Get the current settings version."""
+        # One aggregate over a handful of rows, at most once per check interval
+        count, updated_at = db.session.execute(
+            db.select(func.count(SystemSetting.key), func.max(SystemSetting.updated_at))
+        ).one()
+        return count, updated_at
+    
+    def bump(self):
+        """Advance the settings version; every committed change already moves it."""
+
+class RedisSettingsVersion:
+    """Settings version counter shared by all API processes through Redis."""
+    
+    name = 'redis'
+    
+    def __init__(self, client, key='bewithu:settings:version'):
+        self.client = client
+        self.key = key
+    
+    def read(self):
+        """Get the current settings version."""
+        return int(self.client.get(self.key) or 0)
+    
+    def bump(self):
+        """Advance the settings version, invalidating the caches of other processes."""
+        self.client.incr(self.key)
+
+class SettingsCache:
+    """All system settings as typed values, reloaded when their version changes."""
+    
+    def __init__(self, version, check_interval=1.0):
+        self.version = version
+        self.check_interval = check_interval
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'invalidations': 0, 'errors': 0}
+    
+    def get(self, key, default=None):
+        """Get a setting value by key."""
+        values = self._current()
+        if key not in values:
+            return default
+        value = values[key]
+        # JSON settings are mutable; callers get their own copy as from the database
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+    
+    def _current(self):
+        values = self._values
+        if values is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self._stats['hits'] += 1
+            return values
+        
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._checked_at < self.check_interval:
+                self._stats['hits'] += 1
+                return self._values
+            
+            # Read the version before loading: a concurrent change then makes
+            # the loaded values stale rather than letting them mask the update
+            version = self._read_version()
+            if self._values is None or version is None or version != self._version:
+                rows = db.session.execute(db.select(SystemSetting.key, SystemSetting.value, SystemSetting.data_type))
+                self._values = {row.key: SystemSetting.convert_value(row.value, row.data_type) for row in rows}
+                self._version = version
+                self._stats['loads'] += 1
+            else:
+                self._stats['hits'] += 1
+            self._checked_at = time.monotonic()
+            return self._values
+    
+    def _read_version(self):
+        try:
+            return self.version.read()
+        except Exception:
+            # Reload from the database rather than serve possibly stale values
+            self._stats['errors'] += 1
+            return None
+    
+    def invalidate(self):
+        """Drop the cached settings here and in other processes."""
+        self._stats['invalidations'] += 1
+        try:
+            self.version.bump()
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"Settings cache invalidation error: {e}")
+        with self._lock:
+            self._values = None
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        stats = dict(self._stats)
+        stats['backend'] = self.version.name
+        stats['check_interval'] = self.check_interval
+        stats['settings'] = len(self._values) if self._values is not None else None
+        return stats
+
+def create_settings_version(app):
+    """Create the settings version source for the configured backend."""
+    backend = app.config['SETTINGS_CACHE_BACKEND']
+    
+    if backend in ['auto', 'redis']:
+        client = get_redis(app)
+        if client is not None:
+            return RedisSettingsVersion(client)
+        if backend == 'redis':
+            print("Redis settings cache requested but Redis is unavailable; checking the database for changes")
+    
+    return DatabaseSettingsVersion()
+
+def _record(mapper, connection, setting):
+    session = object_session(setting)
+    if session is not None:
+        session.info['settings_changed'] = True
+
+def _after_commit(session):
+    # Invalidate only once the change is visible, so a reader cannot
+    # reload the old rows under the new version
+    if not session.info.pop('settings_changed', False) or not has_app_context():
+        return
+    
+    cache = current_app.extensions.get('settings_cache')
+    if cache is not None:
+        cache.invalidate()
+
+def _after_rollback(session):
+    session.info.pop('settings_changed', None)
+
+def init_app(app):
+    """Create the settings cache and invalidate it when settings change."""
+    global _registered
+    if app.config['SETTINGS_CACHE_BACKEND'] != 'none':
+        app.extensions['settings_cache'] = SettingsCache(
+            create_settings_version(app),
+            check_interval=app.config['SETTINGS_CACHE_CHECK_INTERVAL']
+        )
+    
+    if not _registered:
+        event.listen(SystemSetting, 'after_insert', _record)
+        event.listen(SystemSetting, 'after_update', _record)
+        event.listen(SystemSetting, 'after_delete', _record)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+        _registered = True
+
+def get_settings_cache():
+    """Get the settings cache of the current application, or None when disabled."""
+    return current_app.extensions.get('settings_cache')
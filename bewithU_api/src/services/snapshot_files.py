@@ -0,0 +1,53 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+@contextmanager
+def snapshot_writer(directory):
+    """Write a set of snapshot files and move them into place together.
+    
+    Yields open(name, mode) returning a uniquely named temporary file in
+    directory, so processes sharing the directory (reloader, several
+    workers) never write the same file. On success the files replace
+    their targets under an exclusive lock, so concurrent writers cannot
+    leave files from different snapshots side by side.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    
+    def open_file(name, mode='wb'):
+        f = tempfile.NamedTemporaryFile(
+            mode=mode,
+            dir=directory,
+            prefix=f'{name}.',
+            suffix='.tmp',
+            delete=False,
+            encoding=None if 'b' in mode else 'utf-8'
+        )
+        written.append((f.name, os.path.join(directory, name)))
+        return f
+    
+    try:
+        yield open_file
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            for temp_path, path in written:
+                os.replace(temp_path, path)
+    finally:
+        for temp_path, _ in written:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+@contextmanager
+def snapshot_reader(directory):
+    """Hold off snapshot_writer() replacements while a set of snapshot files is read."""
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        yield
@@ -0,0 +1,224 @@
+from collections import Counter
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, event, func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.chat import ChatConversation
+from src.models.knowledge import KnowledgeArticle
+from src.models.ticket import Ticket, TicketCounter
+from src.models.user import User
+
+OPEN_STATUSES = ['open', 'pending']
+
+# INSERT constructs of the dialects supporting ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+_registered = False
+
+def count_if(condition):
+    """Conditional aggregate: the number of rows matching a condition."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+class TicketCounts:
+    """Ticket counts by (status, priority), with optional per-user and recent subsets."""
+    
+    def __init__(self, counts=None, assigned=None, recent=0):
+        self.counts = counts or Counter()
+        self.assigned = assigned or Counter()
+        self.recent = recent
+    
+    def total(self, statuses=None, priorities=None, assigned=False):
+        """Sum the counts matching the given statuses and priorities."""
+        counts = self.assigned if assigned else self.counts
+        return sum(
+            count for (status, priority), count in counts.items()
+            if (statuses is None or status in statuses) and (priorities is None or priority in priorities)
+        )
+
+class TicketCounters:
+    """Ticket counts per status and priority kept in the ticket_counters table."""
+    
+    def read(self):
+        """Get the counts of all tickets."""
+        return Counter({(row.status, row.priority): row.count for row in TicketCounter.query.filter(TicketCounter.count != 0)})
+    
+    def lock(self, connection):
+        """Hold off ticket writes and other rebuilds until the transaction ends."""
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            # Conflicts with the row locks of ticket writers and with itself
+            connection.execute(text(
+                f"LOCK TABLE {Ticket.__tablename__}, {TicketCounter.__tablename__} IN SHARE ROW EXCLUSIVE MODE"
+            ))
+        elif dialect == 'sqlite':
+            # Take the write lock before reading, not at the first write
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+    
+    def rebuild(self, connection):
+        """Recompute the counters from the tickets table.
+        
+        Runs as the first statements of a fresh transaction: ticket writes
+        wait until it commits, so no increment made by another process
+        between the snapshot and the rewrite is lost.
+        """
+        self.lock(connection)
+        rows = connection.execute(
+            db.select(Ticket.status, Ticket.priority, func.count()).group_by(Ticket.status, Ticket.priority)
+        ).all()
+        connection.execute(TicketCounter.__table__.delete())
+        if rows:
+            connection.execute(
+                TicketCounter.__table__.insert(),
+                [{'status': status, 'priority': priority, 'count': count} for status, priority, count in rows]
+            )
+    
+    def apply(self, connection, deltas):
+        """Add deltas to the counters within the flushing transaction."""
+        table = TicketCounter.__table__
+        insert = UPSERT_INSERTS.get(connection.dialect.name)
+        for (status, priority), delta in deltas.items():
+            if not delta:
+                continue
+            # Increment in SQL so concurrent transactions do not overwrite each
+            # other; the upsert also lets two of them create the same row
+            if insert is not None:
+                connection.execute(
+                    insert(table).values(status=status, priority=priority, count=delta).on_conflict_do_update(
+                        index_elements=[table.c.status, table.c.priority],
+                        set_={'count': table.c.count + delta}
+                    )
+                )
+                continue
+            
+            result = connection.execute(
+                table.update().where(table.c.status == status, table.c.priority == priority).values(count=table.c.count + delta)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(status=status, priority=priority, count=delta))
+
+def get_ticket_counters():
+    """Get the ticket counters of the current application, or None when disabled."""
+    return current_app.extensions.get('ticket_counters') if has_app_context() else None
+
+def count_tickets(requester_id=None, assignee_id=None, since=None):
+    """Count tickets by status and priority with one grouped query."""
+    counters = get_ticket_counters()
+    if counters is not None and requester_id is None:
+        # All-ticket counts come from the counter rows; the per-user and
+        # recent subsets are indexed counts bounded by their filters
+        counts = TicketCounts(counters.read())
+        if assignee_id:
+            counts.assigned = Counter({
+                (status, priority): count for status, priority, count in db.session.query(
+                    Ticket.status, Ticket.priority, func.count()
+                ).filter(Ticket.assignee_id == assignee_id).group_by(Ticket.status, Ticket.priority)
+            })
+        if since is not None:
+            counts.recent = Ticket.query.filter(Ticket.created_at >= since).count()
+        return counts
+    
+    columns = [Ticket.status, Ticket.priority, func.count()]
+    if assignee_id:
+        columns.append(count_if(Ticket.assignee_id == assignee_id))
+    if since is not None:
+        columns.append(count_if(Ticket.created_at >= since))
+    
+    query = db.session.query(*columns)
+    if requester_id:
+        query = query.filter(Ticket.requester_id == requester_id)
+    
+    counts = TicketCounts()
+    for row in query.group_by(Ticket.status, Ticket.priority):
+        key = (row[0], row[1])
+        counts.counts[key] = row[2]
+        extra = list(row[3:])
+        if assignee_id:
+            counts.assigned[key] = extra.pop(0)
+        if since is not None:
+            counts.recent += extra.pop(0)
+    return counts
+
+def count_users():
+    """Get (total, active) user counts."""
+    return tuple(db.session.query(func.count(User.id), count_if(User.is_active.is_(True))).one())
+
+def count_articles(since):
+    """Get (published, created since) article counts."""
+    return tuple(db.session.query(
+        count_if(KnowledgeArticle.status == 'published'),
+        count_if(KnowledgeArticle.created_at >= since)
+    ).one())
+
+def count_conversations(since=None, user_id=None):
+    """Get (active, created since) conversation counts."""
+    query = db.session.query(
+        count_if(ChatConversation.is_active.is_(True)),
+        count_if(ChatConversation.created_at >= since) if since is not None else db.literal(0)
+    )
+    if user_id:
+        query = query.filter(ChatConversation.user_id == user_id)
+    return tuple(query.one())
+
+def _ticket_deltas(ticket, sign):
+    return Counter({(ticket.status, ticket.priority): sign})
+
+def _after_insert(mapper, connection, ticket):
+    counters = get_ticket_counters()
+    if counters is not None:
+        counters.apply(connection, _ticket_deltas(ticket, 1))
+
+def _after_delete(mapper, connection, ticket):
+    counters = get_ticket_counters()
+    if counters is not None:
+        counters.apply(connection, _ticket_deltas(ticket, -1))
+
+def _after_update(mapper, connection, ticket):
+    # Covers every transition: resolve, close, reopen, assign_to and edits
+    counters = get_ticket_counters()
+    if counters is None:
+        return
+    
+    state = inspect(ticket)
+    status = state.attrs.status.history
+    priority = state.attrs.priority.history
+    if not (status.has_changes() or priority.has_changes()):
+        return
+    
+    old_status = status.deleted[0] if status.deleted else ticket.status
+    old_priority = priority.deleted[0] if priority.deleted else ticket.priority
+    deltas = Counter({(old_status, old_priority): -1})
+    deltas[(ticket.status, ticket.priority)] += 1
+    counters.apply(connection, deltas)
+
+def init_app(app):
+    """Set up incrementally maintained ticket counters when enabled."""
+    global _registered
+    if not app.config['TICKET_COUNTERS_ENABLED']:
+        return None
+    
+    counters = TicketCounters()
+    with app.app_context():
+        # Tickets may have changed while the counters were disabled
+        with db.engine.begin() as connection:
+            counters.rebuild(connection)
+    
+    @app.cli.command('rebuild-ticket-counters')
+    def rebuild_ticket_counters():
+        """Recompute ticket counters from the tickets table."""
+        with db.engine.begin() as connection:
+            counters.rebuild(connection)
+        print("Rebuilt ticket counters")
+    
+    if not _registered:
+        event.listen(Ticket, 'after_insert', _after_insert)
+        event.listen(Ticket, 'after_update', _after_update)
+        event.listen(Ticket, 'after_delete', _after_delete)
+        _registered = True
+    
+    app.extensions['ticket_counters'] = counters
+    return counters
@@ -0,0 +1,120 @@
+import threading
+
+from flask import current_app
+from sqlalchemy import Integer, cast, func, text
+
+from src.models import db
+from src.models.ticket import Ticket, TicketSequence
+
+SEQUENCE_NAME = 'ticket_number_seq'
+
+# Arbitrary key for the advisory lock that serializes sequence setup across processes
+ADVISORY_LOCK_KEY = 0x746b6e6f
+
+def max_ticket_number(connection):
+    """Get the highest number of the existing T-000123 style ticket numbers."""
+    return connection.execute(
+        db.select(func.max(cast(func.substr(Ticket.ticket_number, 3), Integer))).where(Ticket.ticket_number.like('T-%'))
+    ).scalar() or 0
+
+class TicketNumberAllocator:
+    """Hand out ticket numbers from a PostgreSQL sequence or a locked counter row.
+    
+    With a block size above one, each process reserves that many numbers at a
+    time and hands them out from memory, so most tickets need no allocation
+    query at all; numbers then increase per process rather than globally, and
+    a restart leaves a gap of the unused rest of the block.
+    """
+    
+    def __init__(self, engine, block_size=1):
+        self.engine = engine
+        self.block_size = max(block_size, 1)
+        self.use_sequence = engine.dialect.name == 'postgresql'
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._stats = {'allocated': 0, 'reservations': 0}
+    
+    def setup(self):
+        """Create the sequence or counter row, starting after the existing tickets."""
+        with self.engine.begin() as connection:
+            if self.use_sequence:
+                connection.execute(text(f"SELECT pg_advisory_xact_lock({ADVISORY_LOCK_KEY})"))
+            start = max_ticket_number(connection) + 1
+            
+            if self.use_sequence:
+                connection.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME}"))
+                connection.execute(text(f"ALTER SEQUENCE {SEQUENCE_NAME} INCREMENT BY {self.block_size}"))
+                row = connection.execute(text(f"SELECT last_value, is_called FROM {SEQUENCE_NAME}")).one()
+                if (row.last_value + 1 if row.is_called else row.last_value) < start:
+                    connection.execute(text("SELECT setval(:name, :start, false)"), {'name': SEQUENCE_NAME, 'start': start})
+                return
+            
+            table = TicketSequence.__table__
+            # Never move the counter backwards; only catch up with tickets numbered elsewhere
+            result = connection.execute(
+                table.update().where(table.c.name == 'tickets', table.c.value < start - 1).values(value=start - 1)
+            )
+            if result.rowcount == 0 and connection.execute(
+                db.select(table.c.value).where(table.c.name == 'tickets')
+            ).first() is None:
+                connection.execute(table.insert().values(name='tickets', value=start - 1))
+    
+    def allocate(self):
+        """Get the next ticket number."""
+        if self.block_size == 1:
+            with self._lock:
+                self._stats['reservations'] += 1
+                self._stats['allocated'] += 1
+            return self._reserve(db.session, 1)
+        
+        with self._lock:
+            if self._next >= self._end:
+                # A reserved block must survive a rollback of the request that
+                # asked for it, so it is taken in a transaction of its own
+                with self.engine.begin() as connection:
+                    self._next = self._reserve(connection, self.block_size)
+                self._end = self._next + self.block_size
+                self._stats['reservations'] += 1
+            number = self._next
+            self._next += 1
+            self._stats['allocated'] += 1
+            return number
+    
+    def _reserve(self, connection, count):
+        """Reserve count consecutive numbers, returning the first."""
+        if self.use_sequence:
+            # nextval never blocks and is never rolled back; the sequence
+            # increments by the block size, so each value starts a block
+            return connection.execute(text("SELECT nextval(:name)"), {'name': SEQUENCE_NAME}).scalar()
+        
+        # The UPDATE locks the counter row until the transaction ends, so
+        # concurrent allocations queue up instead of reading the same value;
+        # in the request session the ticket INSERT commits along with it
+        table = TicketSequence.__table__
+        connection.execute(
+            table.update().where(table.c.name == 'tickets').values(value=table.c.value + count)
+        )
+        return connection.execute(db.select(table.c.value).where(table.c.name == 'tickets')).scalar() - count + 1
+    
+    def get_stats(self):
+        """Get allocator statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['remaining_in_block'] = self._end - self._next
+        stats['backend'] = 'sequence' if self.use_sequence else 'counter'
+        stats['block_size'] = self.block_size
+        return stats
+
+def init_app(app):
+    """Set up the ticket number allocator."""
+    with app.app_context():
+        allocator = TicketNumberAllocator(db.engine, block_size=app.config['TICKET_NUMBER_BLOCK_SIZE'])
+        allocator.setup()
+    
+    app.extensions['ticket_numbers'] = allocator
+    return allocator
+
+def get_ticket_number_allocator():
+    """Get the ticket number allocator of the current application."""
+    return current_app.extensions.get('ticket_numbers')
@@ -0,0 +1,110 @@
+import re
+import unicodedata
+
+from flask import current_app
+
+# Hiragana, katakana, CJK ideographs (incl. extension A and compatibility) and hangul
+CJK_RUN = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+)')
+WORD = re.compile(r'[^\W_]+')
+
+def normalize(text):
+    """Normalize width and case before tokenizing."""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+def estimate_tokens(text):
+    """Estimate the LLM token count of a text without a model tokenizer."""
+    # CJK characters are about one token each, other text about four characters per token
+    cjk = sum(len(run) for run in CJK_RUN.findall(text or ''))
+    return cjk + (len(text or '') - cjk + 3) // 4
+
+class WordTokenizer:
+    """Split text into words for whitespace-delimited languages."""
+    
+    name = 'word'
+    
+    def tokenize(self, text):
+        """Get the tokens of a text."""
+        return WORD.findall(normalize(text))
+
+class NgramTokenizer:
+    """Split CJK runs into overlapping n-grams and everything else into words."""
+    
+    def __init__(self, n=2):
+        self.n = n
+        self.name = f'ngram{n}'
+    
+    def tokenize(self, text):
+        """Get the tokens of a text."""
+        tokens = []
+        for word in WORD.findall(normalize(text)):
+            # re.split with a capture group alternates non-CJK and CJK parts
+            for position, part in enumerate(CJK_RUN.split(word)):
+                if not part:
+                    continue
+                if position % 2 == 0 or len(part) <= self.n:
+                    tokens.append(part)
+                else:
+                    tokens.extend(part[i:i + self.n] for i in range(len(part) - self.n + 1))
+        return tokens
+
+class LanguageTokenizers:
+    """Choose a tokenizer by article language."""
+    
+    def __init__(self, ngram_languages=('ja', 'zh'), n=2):
+        self.ngram = NgramTokenizer(n)
+        self.word = WordTokenizer()
+        self.ngram_languages = set(ngram_languages)
+        self.name = f"{self.ngram.name}:{','.join(sorted(self.ngram_languages))}"
+    
+    def for_language(self, language):
+        """Get the tokenizer for a language."""
+        # Queries without a language use n-grams, which also split latin words
+        if language is None or language in self.ngram_languages:
+            return self.ngram
+        return self.word
+    
+    def tokenize(self, text, language=None):
+        """Tokenize text with the tokenizer for its language."""
+        return self.for_language(language).tokenize(text)
+
+def create_tokenizers(app):
+    """Create the per-language tokenizers from the application config."""
+    return LanguageTokenizers(
+        ngram_languages=[language.strip() for language in app.config['NGRAM_LANGUAGES'].split(',') if language.strip()],
+        n=app.config['NGRAM_SIZE']
+    )
+
+class TiktokenCounter:
+    """Count tokens with a tiktoken encoding."""
+    
+    name = 'tiktoken'
+    
+    def __init__(self, encoding='cl100k_base'):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding)
+    
+    def __call__(self, text):
+        return len(self.encoding.encode(text or '', disallowed_special=()))
+
+# Token counter factories by LLM_TOKEN_COUNTER name; each takes the app
+TOKEN_COUNTERS = {
+    'heuristic': lambda app: estimate_tokens,
+    'tiktoken': lambda app: TiktokenCounter(app.config['LLM_TOKEN_ENCODING'])
+}
+
+def register_token_counter(name, factory):
+    """Register a token counter factory, e.g. for a model-specific tokenizer."""
+    TOKEN_COUNTERS[name] = factory
+
+def get_token_counter(app=None):
+    """Get the configured token counter, falling back to the character heuristic."""
+    app = app or current_app
+    if 'token_counter' not in app.extensions:
+        name = app.config['LLM_TOKEN_COUNTER']
+        try:
+            counter = TOKEN_COUNTERS[name](app)
+        except Exception as e:
+            print(f"Token counter {name} unavailable ({e!r}); estimating tokens from characters")
+            counter = estimate_tokens
+        app.extensions['token_counter'] = counter
+    return app.extensions['token_counter']
@@ -0,0 +1,221 @@
+import json
+import threading
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from src.models import db
+from src.models.user import User
+from src.services.cache import TTLCache
+from src.services.redis_client import get_redis
+
+# Profile columns served from the cache; password_hash is left out and
+# loads from the database only when a route actually checks a password
+CACHED_FIELDS = [
+    'id', 'username', 'email', 'display_name', 'role', 'language', 'avatar_url',
+    'is_active', 'last_login_at', 'created_at', 'updated_at'
+]
+DATETIME_FIELDS = ['last_login_at', 'created_at', 'updated_at']
+
+_registered = False
+
+def serialize_user(user):
+    """Get the cached profile fields of a user as JSON-safe values."""
+    data = {field: getattr(user, field) for field in CACHED_FIELDS}
+    for field in DATETIME_FIELDS:
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+def attach_user(data):
+    """Attach a cached profile to the session as a persistent User without a query."""
+    values = dict(data)
+    for field in DATETIME_FIELDS:
+        if values[field] is not None:
+            values[field] = datetime.fromisoformat(values[field])
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def load_user(cache, user_id):
+    """Get a user through a cache, from the cache when its version is current."""
+    version, entry = cache.read(user_id)
+    if entry is not None and entry['version'] == version:
+        cache.hits += 1
+        return attach_user(entry['user'])
+    
+    cache.misses += 1
+    user = db.session.get(User, user_id)
+    if user is not None:
+        # Tag with the version read before loading: a concurrent bump
+        # makes this entry stale rather than letting it mask the update
+        cache.write(user_id, {'version': version, 'user': serialize_user(user)})
+    return user
+
+class MemoryUserCache:
+    """Short-lived user profile cache local to this process, invalidated by per-user versions."""
+    
+    name = 'memory'
+    
+    def __init__(self, maxsize=10000, ttl=60):
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+    
+    def read(self, user_id):
+        """Get (current version, cached entry or None)."""
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+        return version, self.cache.get(user_id, count=False)
+    
+    def write(self, user_id, entry):
+        """Store an entry tagged with the version it was loaded under."""
+        self.cache.set(user_id, entry)
+    
+    def load(self, user_id):
+        """Get a user, from the cache when its version is current."""
+        return load_user(self, user_id)
+    
+    def invalidate(self, user_id):
+        """Invalidate cached profiles of a user."""
+        self.invalidations += 1
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self.cache.delete(user_id)
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.name,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+class RedisUserCache:
+    """Short-lived user profile cache shared by all API processes through Redis."""
+    
+    name = 'redis'
+    
+    def __init__(self, client, ttl=60, prefix='bewithu:user'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+    
+    def _version_key(self, user_id):
+        return f'{self.prefix}:version:{user_id}'
+    
+    def _profile_key(self, user_id):
+        return f'{self.prefix}:profile:{user_id}'
+    
+    def read(self, user_id):
+        """Get (current version, cached entry or None)."""
+        try:
+            # One round trip for both the version and the cached entry
+            version, entry = self.client.mget(self._version_key(user_id), self._profile_key(user_id))
+        except Exception:
+            self.errors += 1
+            return None, None
+        return int(version or 0), json.loads(entry) if entry else None
+    
+    def write(self, user_id, entry):
+        """Store an entry tagged with the version it was loaded under."""
+        if entry['version'] is None:
+            return
+        try:
+            self.client.set(self._profile_key(user_id), json.dumps(entry), ex=self.ttl)
+        except Exception:
+            self.errors += 1
+    
+    def load(self, user_id):
+        """Get a user, from the cache when its version is current."""
+        return load_user(self, user_id)
+    
+    def invalidate(self, user_id):
+        """Invalidate cached profiles of a user in every process."""
+        self.invalidations += 1
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(self._version_key(user_id))
+            pipe.delete(self._profile_key(user_id))
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"User cache invalidation error: {e}")
+    
+    def get_stats(self):
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.name,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+def create_user_cache(app):
+    """Create the user cache for the configured backend."""
+    backend = app.config['USER_CACHE_BACKEND']
+    ttl = app.config['USER_CACHE_TTL']
+    
+    if backend in ['auto', 'redis']:
+        client = get_redis(app)
+        if client is not None:
+            return RedisUserCache(client, ttl=ttl)
+        if backend == 'redis':
+            print("Redis user cache requested but Redis is unavailable; using in-process cache")
+    
+    return MemoryUserCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=ttl)
+
+def _record(mapper, connection, user):
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(user.id)
+
+def _after_commit(session):
+    # Bump only once the change is visible, so a reader cannot re-cache
+    # the old row under the new version
+    user_ids = session.info.pop('changed_users', None)
+    if not user_ids or not has_app_context():
+        return
+    
+    cache = current_app.extensions.get('user_cache')
+    if cache is not None:
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+def _after_rollback(session):
+    session.info.pop('changed_users', None)
+
+def init_app(app):
+    """Create the user cache and invalidate it when users change."""
+    global _registered
+    if app.config['USER_CACHE_TTL'] > 0:
+        app.extensions['user_cache'] = create_user_cache(app)
+    
+    if not _registered:
+        event.listen(User, 'after_update', _record)
+        event.listen(User, 'after_delete', _record)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+        _registered = True
+
+def get_user_cache():
+    """Get the user cache of the current application, or None when disabled."""
+    return current_app.extensions.get('user_cache')
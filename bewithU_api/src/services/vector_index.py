@@ -0,0 +1,330 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import current_app
+
+from src.models import db
+from src.models.knowledge import KnowledgeArticle
+from src.models.system import SystemSetting
+from src.services import knowledge_events
+from src.services.llm_client import get_llm_client
+from src.services.snapshot_files import snapshot_reader, snapshot_writer
+
+def chunk_text(text, max_chars=500, overlap=50):
+    """Split text into overlapping chunks on paragraph and sentence boundaries."""
+    text = (text or '').strip()
+    if not text:
+        return []
+    
+    # Sentences end with western or CJK punctuation, or a line break
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?。！？])\s*|\n+', text) if s and s.strip()]
+    
+    chunks = []
+    current = ''
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            # Hard-split very long sentences (e.g. CJK text without punctuation)
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars - overlap:]
+        
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = current[-overlap:] + ' ' + sentence if overlap else sentence
+        else:
+            current = f'{current} {sentence}' if current else sentence
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+def article_chunks(article, max_chars=500, overlap=50):
+    """Get the text chunks indexed for an article snapshot."""
+    header = article['title']
+    if article.get('summary'):
+        header += '\n' + article['summary']
+    return [header] + chunk_text(article['content'], max_chars, overlap)
+
+class OllamaEmbedder:
+    """Embeds text with Ollama's embeddings endpoint."""
+    
+    def __init__(self, model):
+        self.model = model
+        self.name = f'ollama:{model}'
+    
+    def embed(self, text):
+        ollama_url = SystemSetting.get_setting('ollama_base_url', 'http://localhost:11434')
+        vector = get_llm_client().embeddings(self.model, text, base_url=ollama_url)
+        return np.asarray(vector, dtype=np.float32)
+
+class HashingEmbedder:
+    """Deterministic character n-gram hashing embedder for local development and tests."""
+    
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.name = f'hashing:{dimensions}'
+    
+    def embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        text = (text or '').lower()
+        for n in (2, 3):
+            for i in range(len(text) - n + 1):
+                digest = hashlib.blake2b(text[i:i + n].encode('utf-8'), digest_size=4).digest()
+                vector[int.from_bytes(digest, 'little') % self.dimensions] += 1.0
+        return vector
+
+def normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+class VectorIndex:
+    """In-memory cosine similarity index over knowledge article chunks."""
+    
+    def __init__(self, embedder, path=None, chunk_size=500, chunk_overlap=50):
+        self.embedder = embedder
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.matrix = None  # float32 (chunks x dimensions), rows L2-normalized
+        self.chunks = []    # per-row metadata: article_id, language, text
+        self.watermark = None  # latest article updated_at applied to the index (aware UTC)
+        self.ready = False
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.chunks)
+    
+    def _embed_chunks(self, article):
+        texts = article_chunks(article, self.chunk_size, self.chunk_overlap)
+        vectors = np.vstack([normalize(self.embedder.embed(text)) for text in texts]).astype(np.float32)
+        meta = [{'article_id': article['id'], 'language': article['language'], 'text': text} for text in texts]
+        return vectors, meta
+    
+    def _swap(self, matrix, chunks):
+        # Readers take (matrix, chunks) together, so replace both at once
+        self.matrix, self.chunks = matrix, chunks
+    
+    def _advance(self, updated_at):
+        updated_at = knowledge_events.change_time(updated_at)
+        if updated_at and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+    
+    def add_article(self, article):
+        """Index (or re-index) a published article snapshot."""
+        vectors, meta = self._embed_chunks(article)
+        with self._lock:
+            keep = [i for i, chunk in enumerate(self.chunks) if chunk['article_id'] != article['id']]
+            matrix = self.matrix[keep] if self.matrix is not None and keep else None
+            chunks = [self.chunks[i] for i in keep]
+            matrix = vectors if matrix is None else np.vstack([matrix, vectors])
+            self._swap(matrix, chunks + meta)
+            self._advance(article.get('updated_at'))
+    
+    def remove_article(self, article_id):
+        """Remove an article from the index."""
+        with self._lock:
+            keep = [i for i, chunk in enumerate(self.chunks) if chunk['article_id'] != article_id]
+            if len(keep) == len(self.chunks):
+                return
+            matrix = self.matrix[keep] if keep else None
+            self._swap(matrix, [self.chunks[i] for i in keep])
+    
+    def search(self, query, k=5, language=None, min_score=0.0):
+        """Get the top-k chunks for a query as (chunk, score) pairs."""
+        matrix, chunks = self.matrix, self.chunks
+        if matrix is None or not chunks:
+            return []
+        
+        scores = matrix @ normalize(self.embedder.embed(query))
+        if language:
+            mask = np.fromiter((chunk['language'] == language for chunk in chunks), dtype=bool, count=len(chunks))
+            scores = np.where(mask, scores, -np.inf)
+        
+        k = min(k, len(chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(chunks[i], float(scores[i])) for i in top if scores[i] >= min_score]
+    
+    def search_articles(self, query, limit=3, language=None, min_score=0.0):
+        """Get the best matching article ids with their best chunk score."""
+        results = []
+        seen = set()
+        for chunk, score in self.search(query, k=limit * 5, language=language, min_score=min_score):
+            if chunk['article_id'] in seen:
+                continue
+            seen.add(chunk['article_id'])
+            results.append((chunk['article_id'], score))
+            if len(results) >= limit:
+                break
+        return results
+    
+    def build(self, articles):
+        """Rebuild the index from article snapshots."""
+        matrices = []
+        chunks = []
+        for article in articles:
+            vectors, meta = self._embed_chunks(article)
+            matrices.append(vectors)
+            chunks.extend(meta)
+        with self._lock:
+            self._swap(np.vstack(matrices) if matrices else None, chunks)
+            self.watermark = None
+            for article in articles:
+                self._advance(article.get('updated_at'))
+        self.ready = True
+    
+    def apply_changes(self, changes):
+        """Apply committed knowledge article changes."""
+        for change in changes:
+            if change['change'] != 'delete' and change['status'] == 'published':
+                self.add_article(change)
+            else:
+                self.remove_article(change['id'])
+            with self._lock:
+                self._advance(change['updated_at'])
+    
+    def catch_up(self):
+        """Apply article changes committed after the snapshot. Returns whether the index changed."""
+        changed = KnowledgeArticle.query
+        if self.watermark:
+            changed = changed.filter(KnowledgeArticle.updated_at > self.watermark)
+        changes = [knowledge_events.snapshot(article, 'update') for article in changed.all()]
+        self.apply_changes(changes)
+        
+        # Deleted articles leave no trace to catch up on; if the published
+        # count disagrees, drop indexed articles that are gone and add missing ones
+        indexed = {chunk['article_id'] for chunk in self.chunks}
+        published_count = KnowledgeArticle.query.filter_by(status='published').count()
+        if published_count == len(indexed):
+            return bool(changes)
+        
+        published = {article_id for (article_id,) in db.session.query(KnowledgeArticle.id).filter_by(status='published')}
+        for article_id in indexed - published:
+            self.remove_article(article_id)
+        missing = KnowledgeArticle.query.filter(KnowledgeArticle.id.in_(published - indexed)).all() if published - indexed else []
+        self.apply_changes([knowledge_events.snapshot(article, 'insert') for article in missing])
+        return True
+    
+    def save(self):
+        """Persist the index to disk."""
+        if not self.path:
+            return
+        
+        with self._lock:
+            matrix, chunks, watermark = self.matrix, self.chunks, self.watermark
+        
+        # Write to temporary files first so a crash never leaves a torn index
+        with snapshot_writer(self.path) as open_file:
+            with open_file('vectors.npy') as f:
+                np.save(f, matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32))
+            with open_file('chunks.json', 'w') as f:
+                json.dump({
+                    'embedder': self.embedder.name,
+                    'watermark': watermark.isoformat() if watermark else None,
+                    'chunks': chunks
+                }, f, ensure_ascii=False)
+    
+    def load(self):
+        """Load a persisted index, memory-mapping the vectors. Returns success."""
+        if not self.path:
+            return False
+        
+        vectors_path = os.path.join(self.path, 'vectors.npy')
+        meta_path = os.path.join(self.path, 'chunks.json')
+        if not os.path.exists(vectors_path) or not os.path.exists(meta_path):
+            return False
+        
+        with snapshot_reader(self.path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('embedder') != self.embedder.name:
+                # Vectors from a different model are not comparable
+                return False
+            
+            matrix = np.load(vectors_path, mmap_mode='r')
+        with self._lock:
+            self._swap(matrix if meta['chunks'] else None, meta['chunks'])
+            # Snapshots without a watermark are caught up from the start
+            self.watermark = knowledge_events.change_time(meta.get('watermark'))
+        self.ready = True
+        return True
+    
+    def get_stats(self):
+        """Get index statistics."""
+        matrix = self.matrix
+        return {
+            'ready': self.ready,
+            'embedder': self.embedder.name,
+            'chunks': len(self.chunks),
+            'articles': len({chunk['article_id'] for chunk in self.chunks}),
+            'dimensions': int(matrix.shape[1]) if matrix is not None else None,
+            'memory_bytes': int(matrix.nbytes) if matrix is not None else 0,
+            'watermark': self.watermark.isoformat() if self.watermark else None
+        }
+
+def create_embedder(app):
+    """Create the embedder for the configured backend."""
+    if app.config['EMBEDDING_BACKEND'] == 'hashing':
+        return HashingEmbedder()
+    return OllamaEmbedder(app.config['EMBEDDING_MODEL'])
+
+def published_snapshots():
+    """Get snapshots of all published articles."""
+    articles = KnowledgeArticle.query.filter_by(status='published').all()
+    return [knowledge_events.snapshot(article, 'insert') for article in articles]
+
+def init_app(app):
+    """Create the vector index, load or build it, and keep it in sync."""
+    index = VectorIndex(
+        create_embedder(app),
+        path=app.config['VECTOR_INDEX_PATH'],
+        chunk_size=app.config['VECTOR_INDEX_CHUNK_SIZE'],
+        chunk_overlap=app.config['VECTOR_INDEX_CHUNK_OVERLAP']
+    )
+    app.extensions['vector_index'] = index
+    
+    # Embedding may call Ollama, so keep it off request threads
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='vector-index')
+    
+    def build():
+        with app.app_context():
+            try:
+                index.build(published_snapshots())
+                index.save()
+            except Exception as e:
+                print(f"Vector index build error: {e}")
+    
+    def catch_up():
+        # Articles may have changed while this process was down or in other processes
+        with app.app_context():
+            try:
+                if index.catch_up():
+                    index.save()
+            except Exception as e:
+                print(f"Vector index catch-up error: {e}")
+    
+    def apply_changes(changes):
+        with app.app_context():
+            try:
+                index.apply_changes(changes)
+                index.save()
+            except Exception as e:
+                print(f"Vector index update error: {e}")
+    
+    if index.load():
+        executor.submit(catch_up)
+    else:
+        executor.submit(build)
+    knowledge_events.subscribe(lambda changes: executor.submit(apply_changes, changes))
+    return index
+
+def get_vector_index():
+    """Get the vector index of the current application, or None when disabled."""
+    return current_app.extensions.get('vector_index')
@@ -0,0 +1,197 @@
+import atexit
+import threading
+from collections import Counter
+
+from flask import current_app, has_app_context
+
+from src.models import db
+from src.models.knowledge import KnowledgeArticle
+from src.services.redis_client import get_redis
+
+class MemoryViewBuffer:
+    """Pending article views counted in this process."""
+    
+    name = 'memory'
+    
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+    
+    def add(self, counts):
+        """Add views per article id."""
+        with self._lock:
+            self._counts.update(counts)
+    
+    def drain(self):
+        """Take all pending views, leaving the buffer empty."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+    
+    def pending(self):
+        """Get the number of buffered views."""
+        with self._lock:
+            return sum(self._counts.values())
+
+class RedisViewBuffer:
+    """Pending article views shared by all API processes through a Redis hash."""
+    
+    name = 'redis'
+    
+    def __init__(self, client, key='bewithu:article_views'):
+        self.client = client
+        self.key = key
+    
+    def add(self, counts):
+        """Add views per article id."""
+        pipe = self.client.pipeline(transaction=False)
+        for article_id, count in counts.items():
+            pipe.hincrby(self.key, article_id, count)
+        pipe.execute()
+    
+    def drain(self):
+        """Take all pending views, leaving the buffer empty."""
+        # MULTI/EXEC so views counted between the read and the delete are not lost
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(self.key)
+        pipe.delete(self.key)
+        counts, _ = pipe.execute()
+        return Counter({article_id.decode(): int(count) for article_id, count in counts.items()})
+    
+    def pending(self):
+        """Get the number of buffered views."""
+        return sum(int(count) for count in self.client.hvals(self.key))
+
+class ViewCounter:
+    """Buffer article views and add them to view_count in periodic bulk updates."""
+    
+    def __init__(self, engine, buffer, flush_interval=10.0):
+        self.engine = engine
+        self.buffer = buffer
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'recorded': 0, 'flushed': 0, 'flushes': 0, 'errors': 0}
+    
+    def record(self, article_id, count=1):
+        """Count views of an article."""
+        try:
+            self.buffer.add({article_id: count})
+        except Exception as e:
+            # Views are not worth failing the request for
+            print(f"View counter error: {e}")
+            self._incr('errors')
+            return
+        self._incr('recorded', count)
+    
+    def start(self):
+        """Start the flush thread."""
+        self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=5.0):
+        """Stop the flush thread and write the remaining views."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+    
+    def flush(self):
+        """Write all buffered views, returning the number written."""
+        try:
+            counts = self.buffer.drain()
+        except Exception as e:
+            print(f"View counter drain error: {e}")
+            self._incr('errors')
+            return 0
+        counts = {article_id: count for article_id, count in counts.items() if count}
+        if not counts:
+            return 0
+        
+        table = KnowledgeArticle.__table__
+        # Sorted ids give concurrent flushes the same lock order; updated_at is
+        # kept as is (instead of its onupdate default) because a view is not an edit
+        statement = table.update().where(table.c.id == db.bindparam('article_id')).values(
+            view_count=db.func.coalesce(table.c.view_count, 0) + db.bindparam('views'),
+            updated_at=table.c.updated_at
+        )
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(statement, [
+                    {'article_id': article_id, 'views': counts[article_id]} for article_id in sorted(counts)
+                ])
+        except Exception as e:
+            print(f"View counter flush error: {e}")
+            self._incr('errors')
+            # Put the views back for the next flush
+            try:
+                self.buffer.add(counts)
+            except Exception:
+                pass
+            return 0
+        
+        views = sum(counts.values())
+        self._incr('flushed', views)
+        self._incr('flushes')
+        return views
+    
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+    
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def get_stats(self):
+        """Get view counter statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats['pending'] = self.buffer.pending()
+        except Exception:
+            stats['pending'] = None
+        stats['backend'] = self.buffer.name
+        stats['flush_interval'] = self.flush_interval
+        stats['alive'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+def create_view_buffer(app):
+    """Create the view buffer for the configured backend, or None when disabled."""
+    backend = app.config['VIEW_COUNTER_BACKEND']
+    if backend == 'none':
+        return None
+    
+    if backend in ['auto', 'redis']:
+        client = get_redis(app)
+        if client is not None:
+            return RedisViewBuffer(client)
+        if backend == 'redis':
+            print("Redis view counter requested but Redis is unavailable; using in-process buffer")
+    
+    return MemoryViewBuffer()
+
+def init_app(app):
+    """Create and start the article view counter."""
+    buffer = create_view_buffer(app)
+    if buffer is None:
+        return None
+    
+    with app.app_context():
+        engine = db.engine
+    counter = ViewCounter(engine, buffer, flush_interval=app.config['VIEW_COUNTER_FLUSH_INTERVAL'])
+    counter.start()
+    atexit.register(counter.stop)
+    
+    @app.cli.command('flush-view-counts')
+    def flush_view_counts():
+        """Write buffered article views to the database."""
+        print(f"Flushed {counter.flush()} article views")
+    
+    app.extensions['view_counter'] = counter
+    return counter
+
+def get_view_counter():
+    """Get the article view counter of the current application, or None when disabled."""
+    return current_app.extensions.get('view_counter') if has_app_context() else None
@@ -0,0 +1,4 @@
+import os
+
+# src.main creates an application on import; keep it off the development database
+os.environ.setdefault('FLASK_ENV', 'testing')
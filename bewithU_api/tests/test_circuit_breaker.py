@@ -0,0 +1,86 @@
+import pytest
+
+from src.services import circuit_breaker
+from src.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        probe = breaker.before_call()
+        breaker.record(0.1, True, probe=probe)
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    fail(breaker, 2)
+    breaker.record(0.1, False, probe=breaker.before_call())
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+    
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_stats()['rejected'] == 1
+
+def test_half_open_probe_closes_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    fail(breaker)
+    clock.now += 30
+    assert not breaker.is_open()
+    
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    
+    breaker.record(0.1, False, probe=True)
+    assert breaker.state == CLOSED
+    assert breaker.before_call() is False
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    fail(breaker)
+    clock.now += 30
+    
+    breaker.record(0.1, True, probe=breaker.before_call())
+    assert breaker.state == OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 1
+    assert breaker.before_call() is True
+    assert breaker.get_stats()['opened'] == 2
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, slow_call_seconds=5)
+    breaker.record(6, False, probe=breaker.before_call())
+    breaker.record(6, False, probe=breaker.before_call())
+    assert breaker.state == OPEN
+    
+    clock.now += 30
+    breaker.record(6, False, probe=breaker.before_call())
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['slow_calls'] == 3
+
+def test_calls_started_before_opening_do_not_change_state(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    assert breaker.before_call() is False
+    fail(breaker)
+    # A call let through while closed finishes after the circuit opened
+    breaker.record(0.1, False)
+    assert breaker.state == OPEN
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.main import create_app
+from src.models import db
+from src.models.chat import ChatConversation, ChatJob, ChatMessage
+from src.models.user import User
+from src.services import llm_jobs
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    yield app
+    app.extensions['llm_jobs'].stop()
+
+def add_job(status, started_at=None):
+    user = User.query.filter_by(username='admin').first()
+    conversation = ChatConversation(user_id=user.id)
+    db.session.add(conversation)
+    db.session.flush()
+    message = ChatMessage(conversation_id=conversation.id, role='user', content='question')
+    db.session.add(message)
+    db.session.flush()
+    job = ChatJob(
+        conversation_id=conversation.id,
+        user_id=user.id,
+        user_message_id=message.id,
+        status=status,
+        started_at=started_at
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def test_requeue_stale_jobs(app):
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        stale_id = add_job('running', now - timedelta(hours=1))
+        running_id = add_job('running', now - timedelta(seconds=10))
+        
+        assert llm_jobs.requeue_stale_jobs(600) == [stale_id]
+        
+        stale = ChatJob.query.get(stale_id)
+        assert stale.status == 'queued'
+        assert stale.started_at is None
+        assert ChatJob.query.get(running_id).status == 'running'
+
+def test_startup_submits_stale_jobs(app):
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        add_job('queued')
+        add_job('running', now - timedelta(hours=1))
+        add_job('running', now)
+    
+    app.config['LLM_JOB_WORKERS'] = 0
+    pool = llm_jobs.init_app(app)
+    
+    assert pool.queue.size() == 2
+    with app.app_context():
+        assert ChatJob.query.filter_by(status='running').count() == 1
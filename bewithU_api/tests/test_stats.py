@@ -0,0 +1,89 @@
+from collections import Counter
+
+import pytest
+
+from src.main import create_app
+from src.models import db
+from src.models.ticket import Ticket, TicketCounter
+from src.models.user import User
+from src.services import stats
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['TICKET_COUNTERS_ENABLED'] = True
+    stats.init_app(app)
+    yield app
+    app.extensions['llm_jobs'].stop()
+
+def add_ticket(priority='normal'):
+    user = User.query.filter_by(username='admin').first()
+    ticket = Ticket(title='Printer', description='Paper jam', priority=priority, requester_id=user.id)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+def counter_rows():
+    return Counter({(row.status, row.priority): row.count for row in TicketCounter.query if row.count})
+
+def actual_counts():
+    return Counter({
+        (status, priority): count for status, priority, count in db.session.query(
+            Ticket.status, Ticket.priority, db.func.count()
+        ).group_by(Ticket.status, Ticket.priority)
+    })
+
+def test_counters_follow_ticket_transitions(app):
+    counters = app.extensions['ticket_counters']
+    with app.app_context():
+        first = add_ticket()
+        second = add_ticket('high')
+        assert counters.read() == Counter({('open', 'normal'): 1, ('open', 'high'): 1})
+        
+        first.resolve()
+        assert counters.read() == Counter({('resolved', 'normal'): 1, ('open', 'high'): 1})
+        
+        first.close()
+        second.close()
+        assert counters.read() == Counter({('closed', 'normal'): 1, ('closed', 'high'): 1})
+        
+        second.reopen()
+        second.priority = 'urgent'
+        db.session.commit()
+        assert counters.read() == Counter({('closed', 'normal'): 1, ('open', 'urgent'): 1})
+        
+        db.session.delete(first)
+        db.session.commit()
+        assert counters.read() == Counter({('open', 'urgent'): 1})
+        assert counter_rows() == actual_counts()
+
+def test_rolled_back_changes_leave_counters_unchanged(app):
+    counters = app.extensions['ticket_counters']
+    with app.app_context():
+        ticket = add_ticket()
+        ticket.status = 'resolved'
+        db.session.flush()
+        assert counters.read() == Counter({('resolved', 'normal'): 1})
+        db.session.rollback()
+        assert counters.read() == Counter({('open', 'normal'): 1})
+
+def test_apply_creates_missing_rows(app):
+    counters = app.extensions['ticket_counters']
+    with app.app_context():
+        with db.engine.begin() as connection:
+            counters.apply(connection, Counter({('pending', 'low'): 2}))
+        with db.engine.begin() as connection:
+            counters.apply(connection, Counter({('pending', 'low'): -1, ('open', 'low'): 1}))
+        assert counters.read() == Counter({('pending', 'low'): 1, ('open', 'low'): 1})
+
+def test_rebuild_recomputes_counters(app):
+    counters = app.extensions['ticket_counters']
+    with app.app_context():
+        add_ticket()
+        add_ticket('high').resolve()
+        db.session.execute(TicketCounter.__table__.update().values(count=99))
+        db.session.commit()
+        
+        with db.engine.begin() as connection:
+            counters.rebuild(connection)
+        assert counter_rows() == actual_counts() == Counter({('open', 'normal'): 1, ('resolved', 'high'): 1})
@@ -60,6 +60,15 @@ else
     echo "✅ Phi-3 Mini 模型已存在"
 fi
 
+# 嵌入模型：BGE-M3（知识库向量检索）
+if ! ollama list | grep -q "bge-m3"; then
+    echo "📥 下载 BGE-M3 模型（知识库向量检索）..."
+    ollama pull bge-m3
+    echo "✅ BGE-M3 模型下载完成"
+else
+    echo "✅ BGE-M3 模型已存在"
+fi
+
 echo "🎉 所有推荐模型下载完成！"
 
 # 显示已安装的模型